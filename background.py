@@ -0,0 +1,67 @@
+import logging
+import os
+import random
+import threading
+
+# Fraction by which index refresh intervals are randomly stretched or shrunk,
+# so that processes started together do not reload the same tables together.
+refresh_jitter = float(os.environ.get("INDEX_REFRESH_JITTER", "0.2"))
+# First wait before retrying a failed index build; doubles up to the interval.
+retry_seconds = float(os.environ.get("INDEX_RETRY_SECONDS", "1"))
+
+
+def startPeriodic(
+    function, interval, name, jitter=0.0, first_delay=None, retry_delay=None
+):
+    """Calls ``function`` every ``interval`` seconds on a daemon thread until the returned event is set.
+
+    With ``jitter``, each wait is drawn from ``interval * (1 ± jitter)``. The
+    first call comes after ``first_delay`` when it is given. With
+    ``retry_delay``, a failed call is retried after that long, doubling on
+    every further failure up to ``interval``.
+    """
+    stopped = threading.Event()
+
+    def nextDelay():
+        return interval * random.uniform(1 - jitter, 1 + jitter)
+
+    def run():
+        delay = nextDelay() if first_delay is None else first_delay
+        failed_delay = None
+        while not stopped.wait(delay):
+            try:
+                function()
+                delay = nextDelay()
+                failed_delay = None
+            except Exception:
+                logging.exception("Periodic task %s failed", name)
+                if retry_delay is None:
+                    delay = nextDelay()
+                else:
+                    failed_delay = min(
+                        retry_delay if failed_delay is None else failed_delay * 2,
+                        interval,
+                    )
+                    delay = failed_delay
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return stopped
+
+
+def startRefreshing(reload, interval, name, loaded=False):
+    """Builds an index with ``reload`` on a daemon thread now, then every ``interval`` seconds.
+
+    Reloads are jittered by ``INDEX_REFRESH_JITTER`` and failed ones retried
+    from ``INDEX_RETRY_SECONDS`` on, so a database that is down at startup
+    delays the index instead of stopping the process. An index that is
+    already ``loaded`` (inherited from the prefork parent) is first reloaded
+    after a random part of ``interval``, which spreads the workers' reloads.
+    """
+    return startPeriodic(
+        reload,
+        interval,
+        name,
+        jitter=refresh_jitter,
+        first_delay=random.uniform(0, interval) if loaded else 0,
+        retry_delay=retry_seconds,
+    )
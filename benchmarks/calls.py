@@ -0,0 +1,285 @@
+"""Sample requests for every ParticipantService method.
+
+Ids refer to rows created by ``benchmarks.seed`` at any scale. Methods that
+change the rows they name get new users and events for every request, so
+that each call takes the success path instead of failing on the previous
+call's rows.
+"""
+
+from google.protobuf import json_format
+import grpc
+from sqlalchemy import func
+
+import hts.participant.service_pb2_grpc as participant_service_grpc
+from benchmarks.seed import insert
+from db_model import (
+    Answer,
+    Event,
+    Question,
+    QuestionGroup,
+    User,
+    UserEvent,
+    initEngine,
+)
+from extensions import EXTENDED_METHODS, requestType, service
+
+SAMPLE_REQUESTS = {
+    "IsEventAvailable": {"event_id": 1, "date": "2021-01-01T00:00:00Z"},
+    "GetEventById": {"event_id": 1},
+    "GetTagById": {"id": 1},
+    "GetUpcomingEvents": {
+        "start": "2021-01-01T00:00:00Z",
+        "end": "2021-02-01T00:00:00Z",
+    },
+    "GetOnlineEvents": {"n": 10},
+    "GetOnSiteEvents": {"n": 10},
+    "GetEventsByStringOfName": {"text": "fair"},
+    "GetEventsByTagIds": {"tag_ids": [1, 2]},
+    "GetEventsByFacilityId": {"id": 1},
+    "GetEventsByOrganizationId": {"id": 1},
+    "GetEventsByDate": "2021-01-05T00:00:00Z",
+    "GetLocationById": {"id": 1},
+    "GetTagsByEventId": {"id": 1},
+    "GetRatingByEventId": {"id": 1},
+    "GetUsersByEventId": {"event_id": 1, "status": 2},
+    "GetEventDurationsByEventId": {"id": 1},
+    "GetQuestionById": {"id": 1},
+    "GetQuestionGroupsByEventId": {"id": 1},
+    "GetQuestionsByQuestionGroupId": {"id": 1},
+    "GetAnswersByQuestionId": {"id": 1},
+    "GetAnswersByUserEventId": {"id": 1},
+    "GetEventsByUserId": {"user_id": 1},
+    "GetUserEventsByEventId": {"id": 1},
+    "GetPastEventsFromTags": {"tag_id": [1], "number_of_events": 5},
+    "SetRatingByUserEventId": {"user_event_id": 1, "rating": 4},
+    "GenerateQR": {"user_event_id": 1, "user_id": 1, "event_id": 1},
+}
+
+
+class Context:
+    """Stand-in for grpc.ServicerContext when calling handlers directly."""
+
+    def __init__(self, metadata=()):
+        self.metadata = tuple(metadata)
+        self.code = None
+        self.details = None
+        self.trailing_metadata = ()
+
+    def invocation_metadata(self):
+        return self.metadata
+
+    def set_code(self, code):
+        self.code = code
+
+    def set_details(self, details):
+        self.details = details
+
+    def set_trailing_metadata(self, metadata):
+        self.trailing_metadata = metadata
+
+
+# Methods whose requests each need rows of their own.
+WRITE_METHODS = ("JoinEvent", "CancelEvent", "SubmitAnswersForEventQuestion")
+
+
+def nextId(session, model):
+    return (session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def addPairs(session, count, joined=False):
+    """Adds ``count`` users, each with a new event of its own, and returns their ``(user_id, event_id)``.
+
+    The events have no attendee limit. With ``joined``, each user has
+    already joined its event.
+    """
+    user_id, event_id = nextId(session, User), nextId(session, Event)
+    pairs = [(user_id + offset, event_id + offset) for offset in range(count)]
+    with initEngine().begin() as connection:
+        insert(
+            connection,
+            User,
+            [
+                {
+                    "id": user_id,
+                    "first_name": "Benchmark",
+                    "last_name": str(user_id),
+                    "email": "benchmark%d@example.com" % user_id,
+                    "did_setup": True,
+                }
+                for user_id, _ in pairs
+            ],
+        )
+        insert(
+            connection,
+            Event,
+            [
+                {
+                    "id": event_id,
+                    "organization_id": 1,
+                    "location_id": 1,
+                    "name": "Benchmark %d" % event_id,
+                }
+                for _, event_id in pairs
+            ],
+        )
+        if joined:
+            addUserEvents(session, connection, pairs)
+    return pairs
+
+
+def addUserEvents(session, connection, pairs):
+    user_event_id = nextId(session, UserEvent)
+    rows = [
+        {
+            "id": user_event_id + offset,
+            "user_id": user_id,
+            "event_id": event_id,
+            "status": "PENDING",
+            "is_internal": False,
+        }
+        for offset, (user_id, event_id) in enumerate(pairs)
+    ]
+    insert(connection, UserEvent, rows)
+    return [row["id"] for row in rows]
+
+
+def submitAnswersRequests(session, count):
+    """Answers every PRE_EVENT question of event 1, each for a new user who joined it."""
+    users = [user_id for user_id, _ in addPairs(session, count)]
+    with initEngine().begin() as connection:
+        user_events_id = addUserEvents(
+            session, connection, [(user_id, 1) for user_id in users]
+        )
+    questions = (
+        session.query(Question.id)
+        .join(QuestionGroup, Question.question_group_id == QuestionGroup.id)
+        .filter(QuestionGroup.event_id == 1, QuestionGroup.type == "PRE_EVENT")
+        .all()
+    )
+    return [
+        {
+            "user_event_id": user_event_id,
+            "type": 1,
+            "answers": [
+                {"question_id": question_id, "value": "3"}
+                for (question_id,) in questions
+            ],
+        }
+        for user_event_id in user_events_id
+    ]
+
+
+def requestFields(method, session, count):
+    """Fields of ``count`` requests for ``method``; write methods name new rows in each."""
+    if method == "JoinEvent":
+        pairs = addPairs(session, count)
+    elif method == "CancelEvent":
+        pairs = addPairs(session, count, joined=True)
+    elif method == "SubmitAnswersForEventQuestion":
+        return submitAnswersRequests(session, count)
+    else:
+        return [sampleFields(method, session)] * count
+    return [{"user_id": user_id, "event_id": event_id} for user_id, event_id in pairs]
+
+
+def sampleFields(method, session):
+    if method == "GetUserAnswerByQuestionId":
+        user_id, question_id = (
+            session.query(UserEvent.user_id, Answer.question_id)
+            .join(Answer, Answer.user_event_id == UserEvent.id)
+            .order_by(Answer.id)
+            .first()
+        )
+        return {"user_id": user_id, "question_id": question_id}
+    if method == "GetUserEventByUserAndEventId":
+        user_event = session.query(UserEvent).order_by(UserEvent.id).first()
+        return {"user_id": user_event.user_id, "event_id": user_event.event_id}
+    return SAMPLE_REQUESTS.get(method, {})
+
+
+class HandlerRecorder:
+    """Stand-in for grpc.Server that keeps the handlers registered on it."""
+
+    def __init__(self):
+        self.generic_handlers = []
+
+    def add_generic_rpc_handlers(self, generic_handlers):
+        self.generic_handlers.extend(generic_handlers)
+
+    def add_registered_method_handlers(self, service_name, method_handlers):
+        pass
+
+
+class HandlerCallDetails(grpc.HandlerCallDetails):
+    def __init__(self, method):
+        self.method = method
+        self.invocation_metadata = ()
+
+
+def unaryMethods():
+    """Names the generated unary-unary methods.
+
+    Taken from the generated handler kinds: MethodDescriptor has no
+    ``client_streaming`` or ``server_streaming`` in the pinned protobuf.
+    """
+    recorder = HandlerRecorder()
+    participant_service_grpc.add_ParticipantServiceServicer_to_server(
+        participant_service_grpc.ParticipantServiceServicer(), recorder
+    )
+    methods = []
+    for method in service.methods:
+        details = HandlerCallDetails("/%s/%s" % (service.full_name, method.name))
+        handler = next(
+            handler
+            for handler in (
+                generic_handler.service(details)
+                for generic_handler in recorder.generic_handlers
+            )
+            if handler is not None
+        )
+        if not handler.request_streaming and not handler.response_streaming:
+            methods.append(method.name)
+    return methods
+
+
+def buildRequests(method, session, count):
+    """``count`` requests for ``method``, on rows of their own for write methods."""
+    request_type = requestType(method)
+    return [
+        json_format.ParseDict(fields, request_type())
+        for fields in requestFields(method, session, count)
+    ]
+
+
+def buildRequest(method, session):
+    (request,) = buildRequests(method, session, 1)
+    return request
+
+
+def buildExtendedRequests(method, session, batch, count):
+    """``count`` requests for an extended method: lists of ``batch`` for client streams."""
+    request_method, client_streaming = next(
+        (request_method, kind.__name__.startswith("stream_"))
+        for name, kind, request_method, _ in EXTENDED_METHODS
+        if name == method
+    )
+    if not client_streaming:
+        return buildRequests(request_method, session, count)
+
+    if request_method in WRITE_METHODS:
+        requests = buildRequests(request_method, session, batch * count)
+        return [
+            requests[offset : offset + batch]
+            for offset in range(0, batch * count, batch)
+        ]
+
+    # Walk the id field so multi-gets fetch distinct rows.
+    request = buildRequest(request_method, session)
+    id_field = "event_id" if "event_id" in request.DESCRIPTOR.fields_by_name else "id"
+    items = []
+    for offset in range(batch):
+        item = type(request)()
+        item.CopyFrom(request)
+        setattr(item, id_field, 1 + offset)
+        items.append(item)
+    return [items] * count
@@ -0,0 +1,122 @@
+"""Micro-benchmark of Event serialization: per-field wrappers vs helper.getEvents.
+
+    python -m benchmarks.event_serializer --events 10000
+
+``--db`` also times loading every event from the configured database as ORM
+instances and as plain tuples.
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import hts.common.common_pb2 as common
+import hts.participant.service_pb2 as participant_service
+
+from helper import (
+    EVENT_COLUMNS,
+    getEvents,
+    getInt32Value,
+    getStringValue,
+    getTimeStamp,
+    queryEvents,
+)
+
+
+def wrapperEvent(event):
+    return common.Event(
+        id=event.id,
+        organization_id=event.organization_id,
+        location_id=getInt32Value(event.location_id),
+        description=event.description,
+        name=event.name,
+        cover_image_url=getStringValue(event.cover_image_url),
+        cover_image_hash=getStringValue(event.cover_image_hash),
+        poster_image_url=getStringValue(event.poster_image_url),
+        poster_image_hash=getStringValue(event.poster_image_hash),
+        profile_image_url=getStringValue(event.profile_image_url),
+        profile_image_hash=getStringValue(event.profile_image_hash),
+        attendee_limit=event.attendee_limit,
+        contact=getStringValue(event.contact),
+        registration_due_date=getTimeStamp(event.registration_due_date),
+    )
+
+
+def syntheticRows(count):
+    return [
+        (
+            i,
+            i % 50,
+            i % 20,
+            "Description of event %d" % i,
+            "Event %d" % i,
+            "https://example.com/cover/%d.png" % i,
+            "cover%d" % i,
+            "https://example.com/poster/%d.png" % i,
+            "poster%d" % i,
+            None,
+            None,
+            100,
+            "contact@example.com",
+            datetime(2021, 3, 1, 12, 0, 0),
+        )
+        for i in range(count)
+    ]
+
+
+def best(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", action="store_true")
+    args = parser.parse_args()
+
+    rows = syntheticRows(args.events)
+    objects = [SimpleNamespace(**dict(zip(EVENT_COLUMNS, row))) for row in rows]
+
+    results = {
+        "events": args.events,
+        "wrapper_seconds": best(
+            lambda: participant_service.EventsResponse(
+                event=map(wrapperEvent, objects)
+            ),
+            args.repeat,
+        ),
+        "bulk_seconds": best(
+            lambda: getEvents(rows, events=participant_service.EventsResponse().event),
+            args.repeat,
+        ),
+    }
+    results["speedup"] = results["wrapper_seconds"] / results["bulk_seconds"]
+
+    if args.db:
+        from db_model import DBSession, Event, initEngine
+
+        initEngine()
+        session = DBSession()
+        try:
+            results["orm_load_seconds"] = best(
+                lambda: session.query(Event).all(), args.repeat
+            )
+            results["tuple_load_seconds"] = best(
+                lambda: queryEvents(session).all(), args.repeat
+            )
+        finally:
+            session.close()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
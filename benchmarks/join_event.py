@@ -0,0 +1,117 @@
+"""Fires concurrent JoinEvent calls at one event and checks it is not overbooked.
+
+Point ``DATABASE_URL`` at an empty database. ``--users`` users each try to
+join a fresh event with room for ``--limit`` attendees ``--attempts`` times,
+from ``--threads`` threads:
+
+    python -m benchmarks.join_event --users 2000 --limit 500 --threads 32
+
+Exits non-zero when more users than ``--limit`` got in or a user joined twice.
+"""
+
+import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import json
+import random
+import sys
+import time
+
+from sqlalchemy import func
+
+from benchmarks.calls import Context
+from benchmarks.seed import insert, seed
+from benchmarks.server_modes import percentile
+from db_model import DBSession, Event, UserEvent, initEngine
+from extensions import requestType
+from main import ParticipantService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--attempts", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    seed(users=args.users)
+    session = DBSession()
+    try:
+        event_id = session.query(func.max(Event.id)).scalar() + 1
+    finally:
+        session.close()
+    with initEngine().begin() as connection:
+        insert(
+            connection,
+            Event,
+            [
+                {
+                    "id": event_id,
+                    "organization_id": 1,
+                    "location_id": 1,
+                    "name": "Popular",
+                    "attendee_limit": args.limit,
+                }
+            ],
+        )
+
+    servicer = ParticipantService()
+    request_type = requestType("JoinEvent")
+    users = list(range(1, args.users + 1)) * args.attempts
+    random.Random(0).shuffle(users)
+
+    def join(user_id):
+        context = Context()
+        start = time.perf_counter()
+        try:
+            servicer.JoinEvent(
+                request_type(user_id=user_id, event_id=event_id), context
+            )
+        except Exception:
+            if context.code is None:
+                context.code = "ERROR"
+        return context.code, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as executor:
+        results = list(executor.map(join, users))
+    elapsed = time.perf_counter() - start
+
+    session = DBSession()
+    try:
+        joined = [
+            user_id
+            for (user_id,) in session.query(UserEvent.user_id).filter(
+                UserEvent.event_id == event_id
+            )
+        ]
+    finally:
+        session.close()
+
+    codes = Counter(str(code or "OK") for code, _ in results)
+    latencies = [latency for _, latency in results]
+    overbooked = len(joined) > args.limit
+    duplicated = len(joined) != len(set(joined))
+    print(
+        json.dumps(
+            {
+                "calls": len(users),
+                "codes": codes,
+                "joined": len(joined),
+                "limit": args.limit,
+                "overbooked": overbooked,
+                "duplicated": duplicated,
+                "calls_per_second": len(users) / elapsed,
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+            },
+            indent=2,
+        )
+    )
+    if overbooked or duplicated:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Measures CPU time per call of the cheap lookup RPCs.
+
+Point ``DATABASE_URL`` at an empty database; it is seeded with
+``benchmarks.seed``. Each method is called ``--calls`` times directly on the
+servicer (no gRPC), after a warm-up call, and the process CPU time per call
+is reported. Lookups this small are dominated by Python work, so the number
+shows what query construction and compilation cost:
+
+    python -m benchmarks.lookup_cpu --output before.json
+    python -m benchmarks.lookup_cpu --baseline before.json
+"""
+
+import argparse
+import json
+import time
+
+from benchmarks.calls import Context, buildRequest
+from benchmarks.seed import seed
+from db_model import DBSession
+from helper import event_cache, question_schema_cache
+from main import ParticipantService
+
+LOOKUP_METHODS = (
+    "GetTagById",
+    "GetLocationById",
+    "GetQuestionById",
+    "GetTagsByEventId",
+    "GetRatingByEventId",
+    "GetEventDurationsByEventId",
+    "GetQuestionGroupsByEventId",
+    "GetQuestionsByQuestionGroupId",
+    "GetAnswersByUserEventId",
+    "GetUserAnswerByQuestionId",
+    "GetUserEventByUserAndEventId",
+)
+
+
+def measure(servicer, method, calls):
+    session = DBSession()
+    try:
+        request = buildRequest(method, session)
+    finally:
+        session.close()
+
+    handler = getattr(servicer, method)
+
+    def call():
+        try:
+            handler(request, Context())
+        except Exception:
+            # throwError raises once NOT_FOUND is set; the lookup still ran.
+            pass
+
+    call()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(calls):
+        call()
+    return {
+        "cpu_us_per_call": (time.process_time() - cpu_start) / calls * 1e6,
+        "wall_us_per_call": (time.perf_counter() - wall_start) / calls * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--methods", nargs="+", default=list(LOOKUP_METHODS))
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--baseline", help="results of an earlier run to compare")
+    args = parser.parse_args()
+
+    seed()
+    event_cache.clear()
+    question_schema_cache.clear()
+    servicer = ParticipantService()
+    results = {method: measure(servicer, method, args.calls) for method in args.methods}
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        for method, result in results.items():
+            if method in baseline:
+                result["cpu_change"] = (
+                    result["cpu_us_per_call"] / baseline[method]["cpu_us_per_call"] - 1
+                )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
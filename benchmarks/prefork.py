@@ -0,0 +1,80 @@
+"""Measures how throughput scales with ``GRPC_PROCESSES``.
+
+Starts ``main.py`` once per ``--processes`` value against the database
+configured in the environment. ``--clients`` load generator processes, each
+with its own connection, fire ``--requests`` calls of ``--method`` in total.
+SO_REUSEPORT balances connections rather than calls, so use at least as
+many clients as server processes:
+
+    python -m benchmarks.prefork --processes 1 2 4 --clients 8 --method GetAllEvents
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.server_modes import drive
+
+
+def runClient(args):
+    address, method, requests, concurrency, fields = args
+    return asyncio.run(drive(address, method, requests, concurrency, fields))
+
+
+def runProcesses(processes, args):
+    env = dict(os.environ, GRPC_PROCESSES=str(processes), GRPC_PORT=str(args.port))
+    server = subprocess.Popen([sys.executable, "main.py"], env=env)
+    try:
+        address = "localhost:" + str(args.port)
+        fields = json.loads(args.request)
+        # Waits for the server and warms it up before timing.
+        runClient((address, args.method, processes * 10, processes, fields))
+
+        per_client = args.requests // args.clients
+        with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+            start = time.perf_counter()
+            results = pool.map(
+                runClient,
+                [
+                    (address, args.method, per_client, args.concurrency, fields)
+                    for _ in range(args.clients)
+                ],
+            )
+            elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "requests": per_client * args.clients,
+        "throughput": per_client * args.clients / elapsed,
+        "worst_client_p50_ms": max(result["p50_ms"] for result in results),
+        "worst_client_p99_ms": max(result["p99_ms"] for result in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--method", default="GetAllEvents")
+    parser.add_argument("--request", default="{}", help="request fields as JSON")
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=8, help="per client")
+    parser.add_argument("--port", type=int, default=50063)
+    args = parser.parse_args()
+
+    results = {processes: runProcesses(processes, args) for processes in args.processes}
+    baseline = results[args.processes[0]]["throughput"]
+    for result in results.values():
+        result["speedup"] = result["throughput"] / baseline
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
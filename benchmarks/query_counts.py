@@ -0,0 +1,131 @@
+"""Fails when the number of queries a ParticipantService method runs grows with the data.
+
+Seeds a fresh SQLite database at each ``--scales`` value in a subprocess,
+calls every unary method once with ``benchmarks.calls`` requests and
+compares the query counts:
+
+    python -m benchmarks.query_counts --scales 1 4
+
+A handler that raises without setting a status code on its context has
+crashed rather than answered with an error; such methods are reported and
+also fail the run, since their counts say nothing. ``tests/`` runs the same
+check under pytest.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+
+def countQueries(scale):
+    from sqlalchemy import event
+
+    from benchmarks.calls import Context, buildRequest, unaryMethods
+    from benchmarks.seed import seed
+    from db_model import DBSession, initEngine
+    from helper import event_cache
+    from main import ParticipantService
+
+    seed(scale=scale)
+    servicer = ParticipantService()
+    statements = []
+    event.listen(
+        initEngine(),
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    counts = {}
+    errors = {}
+    for method in unaryMethods():
+        session = DBSession()
+        try:
+            request = buildRequest(method, session)
+        finally:
+            session.close()
+
+        event_cache.clear()
+        del statements[:]
+        context = Context()
+        try:
+            getattr(servicer, method)(request, context)
+        except Exception as error:
+            # throwError raises once it has set the status code.
+            if context.code is None:
+                errors[method] = repr(error)
+        counts[method] = len(statements)
+    return {"counts": counts, "errors": errors}
+
+
+def runScale(scale):
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            DATABASE_URL="sqlite:///" + os.path.join(directory, "bench.db"),
+        )
+        output = os.path.join(directory, "counts.json")
+        subprocess.check_call(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.query_counts",
+                "--count",
+                str(scale),
+                "--output",
+                output,
+            ],
+            env=env,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        with open(output) as file:
+            return json.load(file)
+
+
+def growingMethods(results):
+    """Returns the methods whose query count differs between the ``runScale`` results."""
+    scales = sorted(results)
+    baseline = results[scales[0]]["counts"]
+    return sorted(
+        method
+        for method, count in baseline.items()
+        if any(results[scale]["counts"][method] != count for scale in scales[1:])
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--count", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.count is not None:
+        with open(args.output, "w") as file:
+            json.dump(countQueries(args.count), file)
+        return
+
+    results = {scale: runScale(scale) for scale in args.scales}
+    growing = growingMethods(results)
+    errors = {scale: result["errors"] for scale, result in results.items()}
+
+    print(
+        json.dumps(
+            {
+                "queries": {
+                    scale: result["counts"] for scale, result in results.items()
+                },
+                "errors": errors,
+                "growing": growing,
+            },
+            indent=2,
+        )
+    )
+    if growing or any(errors.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Load-tests every ParticipantService RPC through an in-process gRPC server.
+
+Point ``DATABASE_URL`` at an empty database (SQLite, or the docker-compose
+PostgreSQL). It is seeded with ``benchmarks.seed`` at ``--scale``, then each
+method gets one warm-up call and ``--requests`` calls with ``--concurrency``
+in flight. Throughput, latency percentiles, SQL statements per call and
+status codes are printed as JSON. Write methods get new rows for every
+call, so that all calls should succeed:
+
+    python -m benchmarks.rpcs --scale 2 --concurrency 8 --output after.json
+    python -m benchmarks.rpcs --scale 2 --concurrency 8 --baseline after.json
+
+Methods with calls that did not return OK, or whose ``Status`` responses
+carry another code, are listed as failing and the exit status is non-zero:
+their numbers measure an error path. With ``--baseline`` (the ``--output``
+of an earlier run) methods whose p99 grew by more than ``--tolerance`` or
+that run more statements per call are listed as regressions and also fail
+the run.
+"""
+
+import argparse
+from collections import Counter
+import itertools
+import json
+import sys
+import threading
+import time
+
+import grpc
+from google.protobuf import symbol_database
+from google.rpc import status_pb2
+from sqlalchemy import event
+
+from benchmarks.calls import buildExtendedRequests, buildRequests
+from benchmarks.seed import seed
+from benchmarks.server_modes import percentile
+from db_model import DBSession, initEngine
+from extensions import EXTENDED_METHODS, service
+from main import createThreadedServer
+from recommender import suggestion_engine
+from schedule import event_calendar
+from search import event_search
+
+
+def listMethods():
+    """Returns ``(name, handler kind, response type)`` for every served method."""
+    methods = [
+        (
+            method.name,
+            "unary_unary",
+            symbol_database.Default().GetSymbol(method.output_type.full_name),
+        )
+        for method in service.methods
+    ]
+    methods.extend(
+        (name, kind.__name__[: -len("_rpc_method_handler")], response_type)
+        for name, kind, _, response_type in EXTENDED_METHODS
+    )
+    return methods
+
+
+# StatusCode names by their numeric value, for google.rpc.Status responses.
+CODE_NAMES = {code.value[0]: code.name for code in grpc.StatusCode}
+
+
+def buildCall(channel, name, kind, response_type, batch, count):
+    """Returns a function making one call per request of ``count``.
+
+    It returns the code names of the ``Status`` responses, if any.
+    """
+    session = DBSession()
+    try:
+        if name in service.methods_by_name:
+            requests = buildRequests(name, session, count)
+        else:
+            requests = buildExtendedRequests(name, session, batch, count)
+    finally:
+        session.close()
+    requests = iter(requests)
+
+    multi_callable = getattr(channel, kind)(
+        "/%s/%s" % (service.full_name, name),
+        request_serializer=lambda message: message.SerializeToString(),
+        response_deserializer=response_type.FromString,
+    )
+    client_streaming, server_streaming = (part == "stream" for part in kind.split("_"))
+
+    def call():
+        request = next(requests)
+        response = multi_callable(iter(request) if client_streaming else request)
+        responses = list(response) if server_streaming else [response]
+        if response_type is status_pb2.Status:
+            return [CODE_NAMES[status.code] for status in responses]
+        return []
+
+    return call
+
+
+def measure(call, requests, concurrency, statements):
+    latencies = []
+    codes = Counter()
+    item_codes = Counter()
+    issued = itertools.count()
+    lock = threading.Lock()
+
+    def worker():
+        while next(issued) < requests:
+            start = time.perf_counter()
+            items = []
+            try:
+                items = call()
+                code = grpc.StatusCode.OK
+            except grpc.RpcError as error:
+                code = error.code()
+            latency = time.perf_counter() - start
+            with lock:
+                latencies.append(latency)
+                codes[code.name] += 1
+                item_codes.update(items)
+
+    statements_before = statements[0]
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "throughput": requests / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "queries_per_call": (statements[0] - statements_before) / requests,
+        "codes": dict(codes),
+        "item_codes": dict(item_codes),
+    }
+
+
+def findFailures(results):
+    """Lists the methods that answered anything but OK, as a call or in a Status."""
+    failures = []
+    for method, result in sorted(results.items()):
+        codes = set(result["codes"]) | set(result["item_codes"])
+        codes.discard("OK")
+        if codes:
+            failures.append("%s: %s" % (method, ", ".join(sorted(codes))))
+    return failures
+
+
+def findRegressions(results, baseline, tolerance):
+    regressions = []
+    for method, result in sorted(results.items()):
+        before = baseline.get(method)
+        if before is None:
+            continue
+        if result["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            regressions.append(
+                "%s: p99 %.2f ms -> %.2f ms"
+                % (method, before["p99_ms"], result["p99_ms"])
+            )
+        if result["queries_per_call"] > before["queries_per_call"]:
+            regressions.append(
+                "%s: %.2f -> %.2f queries per call"
+                % (method, before["queries_per_call"], result["queries_per_call"])
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--tags", type=int, default=20)
+    parser.add_argument("--events-per-user", type=int, default=5)
+    parser.add_argument("--questions", type=int, default=5, help="per event form")
+    parser.add_argument("--requests", type=int, default=200, help="per method")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch", type=int, default=10, help="client stream size")
+    parser.add_argument("--methods", nargs="+", help="default: all")
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--baseline", help="results of an earlier run to compare")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    counts = seed(
+        scale=args.scale,
+        users=args.users,
+        events=args.events,
+        tags=args.tags,
+        events_per_user=args.events_per_user,
+        questions_per_event=args.questions,
+    )
+    # What serve() loads at startup, without the refresh threads, so that
+    # statements are only counted for the calls.
+    suggestion_engine.refresh()
+    event_search.reload()
+    event_calendar.reload()
+
+    statements = [0]
+    statements_lock = threading.Lock()
+
+    def countStatement(*args):
+        with statements_lock:
+            statements[0] += 1
+
+    event.listen(initEngine(), "before_cursor_execute", countStatement)
+
+    server = createThreadedServer()
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    results = {}
+    try:
+        with grpc.insecure_channel("localhost:%d" % port) as channel:
+            for name, kind, response_type in listMethods():
+                if args.methods and name not in args.methods:
+                    continue
+                # One request for the warm-up call, then one per measured call.
+                call = buildCall(
+                    channel, name, kind, response_type, args.batch, args.requests + 1
+                )
+                try:
+                    call()
+                except grpc.RpcError:
+                    pass
+                results[name] = measure(
+                    call, args.requests, args.concurrency, statements
+                )
+    finally:
+        server.stop(None)
+
+    failures = findFailures(results)
+    report = {
+        "seed": counts,
+        "concurrency": args.concurrency,
+        "methods": results,
+        "failures": failures,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["methods"]
+        regressions = findRegressions(results, baseline, args.tolerance)
+        report["regressions"] = regressions
+
+    print(json.dumps(report, indent=2))
+    if failures or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
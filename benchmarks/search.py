@@ -0,0 +1,72 @@
+"""Times event search at growing table sizes to check that latency stays flat.
+
+    python -m benchmarks.search --sizes 10000 100000 200000
+
+Runs entirely in memory on synthetic names and descriptions.
+"""
+
+import argparse
+import json
+import random
+import time
+
+from benchmarks.server_modes import percentile
+from search import EventSearchIndex
+
+SYLLABLES = "ka ri to mu sen na bo chu la pi de go ran ti vo lek sa mo".split()
+
+
+def syntheticWords(count, rng):
+    return [
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        for _ in range(count)
+    ]
+
+
+def syntheticRows(count, words, rng):
+    return [
+        (
+            event_id,
+            " ".join(rng.choice(words) for _ in range(3)),
+            " ".join(rng.choice(words) for _ in range(20)),
+        )
+        for event_id in range(1, count + 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    words = syntheticWords(args.vocabulary, rng)
+    results = {}
+    for size in args.sizes:
+        index = EventSearchIndex()
+        start = time.perf_counter()
+        index.upsert(syntheticRows(size, words, rng))
+        build_seconds = time.perf_counter() - start
+
+        latencies = []
+        for _ in range(args.queries):
+            word = rng.choice(words)
+            text = word[: rng.randint(1, len(word))]
+            start = time.perf_counter()
+            index.search(text, args.limit)
+            latencies.append(time.perf_counter() - start)
+
+        results[size] = {
+            "build_seconds": build_seconds,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""Synthetic data for benchmarks, sized by ``scale``.
+
+Point ``DATABASE_URL`` at an empty database (e.g. ``sqlite:///bench.db``);
+``seed`` creates the tables that do not exist yet.
+"""
+
+from datetime import datetime, timedelta
+import random
+
+from sqlalchemy import func, select
+
+from db_model import (
+    Answer,
+    Event,
+    EventDuration,
+    EventTag,
+    Facility,
+    FacilityRequest,
+    Location,
+    Organization,
+    Question,
+    QuestionGroup,
+    Tag,
+    User,
+    UserEvent,
+    initEngine,
+    prepareSchema,
+)
+
+STATUSES = ("PENDING", "APPROVED", "REJECTED", "ATTENDED")
+
+
+def insert(connection, model, rows):
+    """Inserts ``rows`` with their explicit ids.
+
+    On PostgreSQL the id sequence is moved past them, so that rows the
+    service inserts afterwards do not collide with the seeded ones.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    connection.execute(table.insert(), rows)
+    if connection.dialect.name == "postgresql" and "id" in table.c:
+        name = connection.dialect.identifier_preparer.format_table(table)
+        connection.execute(
+            select(
+                [
+                    func.setval(
+                        func.pg_get_serial_sequence(name, "id"), func.max(table.c.id)
+                    )
+                ]
+            )
+        )
+
+
+def seed(
+    scale=1,
+    users=100,
+    events=50,
+    tags=20,
+    tags_per_event=3,
+    events_per_user=5,
+    questions_per_event=5,
+    seed_value=0,
+):
+    """Fills the database with ``scale`` times the given row counts and returns the counts.
+
+    Per-row fan-out (tags per event, events per user) grows with ``scale`` too,
+    so list results get longer as well as the tables.
+    """
+    rng = random.Random(seed_value)
+    users *= scale
+    events *= scale
+    tags *= scale
+    tags_per_event *= scale
+    events_per_user *= scale
+    start = datetime(2021, 1, 1)
+
+    prepareSchema("create")
+    with initEngine().begin() as connection:
+        insert(connection, Organization, [{"id": i} for i in range(1, 11)])
+        insert(
+            connection,
+            Location,
+            [
+                {
+                    "id": i,
+                    "name": "Location %d" % i,
+                    "google_map_url": "https://maps.example.com/%d" % i,
+                    "is_online": i % 2 == 0,
+                }
+                for i in range(1, 21)
+            ],
+        )
+        insert(
+            connection,
+            Event,
+            [
+                {
+                    "id": i,
+                    "organization_id": 1 + i % 10,
+                    "location_id": 1 + i % 20,
+                    "description": "Description of event %d" % i,
+                    "name": "Event %d %s" % (i, rng.choice(("Fair", "Talk", "Camp"))),
+                    "cover_image_url": "https://example.com/cover/%d.png" % i,
+                    "attendee_limit": 10 * events_per_user,
+                    "contact": "contact@example.com",
+                    "registration_due_date": start + timedelta(days=i % 365),
+                }
+                for i in range(1, events + 1)
+            ],
+        )
+        insert(
+            connection,
+            EventDuration,
+            [
+                {
+                    "event_id": i,
+                    "start": start + timedelta(days=i % 365, hours=day * 24),
+                    "finish": start + timedelta(days=i % 365, hours=day * 24 + 3),
+                }
+                for i in range(1, events + 1)
+                for day in range(1 + i % 3)
+            ],
+        )
+        insert(
+            connection,
+            Tag,
+            [{"id": i, "name": "Tag %d" % i} for i in range(1, tags + 1)],
+        )
+        insert(
+            connection,
+            EventTag,
+            [
+                {"event_id": i, "tag_id": tag_id}
+                for i in range(1, events + 1)
+                for tag_id in rng.sample(range(1, tags + 1), tags_per_event)
+            ],
+        )
+        insert(
+            connection, Facility, [{"id": i, "name": "Facility %d" % i} for i in (1, 2)]
+        )
+        insert(
+            connection,
+            FacilityRequest,
+            [{"event_id": i, "facility_id": 1 + i % 2} for i in range(1, events + 1)],
+        )
+        insert(
+            connection,
+            User,
+            [
+                {
+                    "id": i,
+                    "first_name": "First %d" % i,
+                    "last_name": "Last %d" % i,
+                    "email": "user%d@example.com" % i,
+                    "is_chula_student": i % 2 == 0,
+                    "gender": "NS",
+                    "did_setup": True,
+                }
+                for i in range(1, users + 1)
+            ],
+        )
+
+        user_events = []
+        for user_id in range(1, users + 1):
+            for event_id in rng.sample(range(1, events + 1), events_per_user):
+                user_events.append(
+                    {
+                        "id": len(user_events) + 1,
+                        "user_id": user_id,
+                        "event_id": event_id,
+                        "rating": rng.randint(1, 5),
+                        "status": rng.choice(STATUSES),
+                        "is_internal": False,
+                    }
+                )
+        insert(connection, UserEvent, user_events)
+
+        insert(
+            connection,
+            QuestionGroup,
+            [
+                {
+                    "id": i * 2 - offset,
+                    "event_id": i,
+                    "type": question_type,
+                    "seq": 1,
+                    "title": "Questions",
+                }
+                for i in range(1, events + 1)
+                for offset, question_type in ((1, "PRE_EVENT"), (0, "POST_EVENT"))
+            ],
+        )
+        insert(
+            connection,
+            Question,
+            [
+                {
+                    "id": (group_id - 1) * questions_per_event + seq,
+                    "question_group_id": group_id,
+                    "seq": seq,
+                    "answer_type": "SCALE" if seq % 2 else "TEXT",
+                    "is_optional": seq == questions_per_event,
+                    "title": "Question %d" % seq,
+                    "subtitle": "",
+                }
+                for group_id in range(1, events * 2 + 1)
+                for seq in range(1, questions_per_event + 1)
+            ],
+        )
+        insert(
+            connection,
+            Answer,
+            [
+                {
+                    "user_event_id": user_event["id"],
+                    "question_id": (user_event["event_id"] * 2 - 2)
+                    * questions_per_event
+                    + seq,
+                    "value": str(rng.randint(1, 5)),
+                }
+                for user_event in user_events[::2]
+                for seq in range(1, questions_per_event + 1)
+            ],
+        )
+
+    return {
+        "users": users,
+        "events": events,
+        "tags": tags,
+        "user_events": len(user_events),
+    }
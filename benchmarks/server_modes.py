@@ -0,0 +1,99 @@
+"""Compares p50/p99 latency of the threaded and grpc.aio server modes.
+
+Starts ``main.py`` once per mode against the database configured in the
+environment and fires ``--requests`` calls of ``--method`` with
+``--concurrency`` in flight:
+
+    python -m benchmarks.server_modes --method GetAllEvents --concurrency 100
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import grpc
+from google.protobuf import symbol_database
+
+import hts.participant.service_pb2 as participant_service
+import hts.participant.service_pb2_grpc as participant_service_grpc
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def requestType(method):
+    service = participant_service.DESCRIPTOR.services_by_name["ParticipantService"]
+    input_type = service.methods_by_name[method].input_type
+    return symbol_database.Default().GetSymbol(input_type.full_name)
+
+
+async def drive(address, method, requests, concurrency, fields):
+    latencies = []
+    request = requestType(method)(**fields)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with grpc.aio.insecure_channel(address) as channel:
+        await channel.channel_ready()
+        call = getattr(participant_service_grpc.ParticipantServiceStub(channel), method)
+
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await call(request)
+                except grpc.aio.AioRpcError:
+                    pass
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "throughput": requests / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def runMode(mode, args):
+    env = dict(os.environ, GRPC_SERVER_MODE=mode, GRPC_PORT=str(args.port))
+    server = subprocess.Popen([sys.executable, "main.py"], env=env)
+    try:
+        return asyncio.run(
+            drive(
+                "localhost:" + str(args.port),
+                args.method,
+                args.requests,
+                args.concurrency,
+                json.loads(args.request),
+            )
+        )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--method", default="GetAllEvents")
+    parser.add_argument("--request", default="{}", help="request fields as JSON")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--port", type=int, default=50061)
+    args = parser.parse_args()
+
+    results = {mode: runMode(mode, args) for mode in ("thread", "aio")}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Times how long ``main.py`` takes to start serving.
+
+Starts the server ``--runs`` times against the database configured in the
+environment and measures the time from spawning the process to the first
+successful Ping, once per ``DB_SCHEMA`` mode. Also reports how long a bare
+``import main`` takes, which is what tools and benchmarks pay:
+
+    python -m benchmarks.startup --runs 5 --schema skip create
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import grpc
+from google.protobuf.empty_pb2 import Empty
+
+import hts.participant.service_pb2_grpc as participant_service_grpc
+from benchmarks.server_modes import percentile
+
+
+def timeImport():
+    start = time.perf_counter()
+    subprocess.check_call([sys.executable, "-c", "import main"])
+    imported = time.perf_counter() - start
+
+    start = time.perf_counter()
+    subprocess.check_call([sys.executable, "-c", "pass"])
+    return imported - (time.perf_counter() - start)
+
+
+def timeStartup(port, schema, timeout):
+    env = dict(os.environ, GRPC_PORT=str(port), DB_SCHEMA=schema)
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "main.py"], env=env)
+    try:
+        # Retry the connection every few milliseconds instead of backing off.
+        options = [
+            ("grpc.initial_reconnect_backoff_ms", 5),
+            ("grpc.min_reconnect_backoff_ms", 5),
+            ("grpc.max_reconnect_backoff_ms", 5),
+        ]
+        with grpc.insecure_channel("localhost:%d" % port, options) as channel:
+            ping = participant_service_grpc.ParticipantServiceStub(channel).Ping
+            ping(Empty(), timeout=timeout, wait_for_ready=True)
+            return time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--schema", nargs="+", default=["skip", "create"])
+    parser.add_argument("--port", type=int, default=50062)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    results = {"import_main_seconds": timeImport()}
+    for schema in args.schema:
+        startups = [
+            timeStartup(args.port, schema, args.timeout) for _ in range(args.runs)
+        ]
+        results[schema] = {
+            "runs": args.runs,
+            "min_seconds": min(startups),
+            "p50_seconds": percentile(startups, 50),
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Times SubmitAnswersForEventQuestion for forms of different sizes.
+
+Point ``DATABASE_URL`` at an empty database. The base data comes from
+``benchmarks.seed``; each ``--questions`` size then gets its own event with a
+PRE_EVENT form of that many questions, and ``--submissions`` users submit it:
+
+    python -m benchmarks.submit_answers --questions 10 50 200
+"""
+
+import argparse
+import json
+import time
+
+from sqlalchemy import event, func
+
+from benchmarks.calls import Context
+from benchmarks.seed import insert, seed
+from benchmarks.server_modes import percentile
+from db_model import (
+    DBSession,
+    Event,
+    Question,
+    QuestionGroup,
+    UserEvent,
+    initEngine,
+)
+from extensions import requestType
+from main import ParticipantService
+
+
+def createForm(questions, submissions):
+    """Adds an event with a ``questions`` long form and returns its user_event ids."""
+    session = DBSession()
+    try:
+        event_id = session.query(func.max(Event.id)).scalar() + 1
+        group_id = session.query(func.max(QuestionGroup.id)).scalar() + 1
+        question_id = session.query(func.max(Question.id)).scalar() + 1
+        user_event_id = session.query(func.max(UserEvent.id)).scalar() + 1
+    finally:
+        session.close()
+
+    with initEngine().begin() as connection:
+        insert(
+            connection,
+            Event,
+            [{"id": event_id, "organization_id": 1, "location_id": 1, "name": "Form"}],
+        )
+        insert(
+            connection,
+            QuestionGroup,
+            [{"id": group_id, "event_id": event_id, "type": "PRE_EVENT", "seq": 1}],
+        )
+        insert(
+            connection,
+            Question,
+            [
+                {
+                    "id": question_id + seq,
+                    "question_group_id": group_id,
+                    "seq": seq,
+                    "answer_type": "SCALE",
+                    "is_optional": False,
+                    "title": "Question %d" % seq,
+                }
+                for seq in range(questions)
+            ],
+        )
+        insert(
+            connection,
+            UserEvent,
+            [
+                {
+                    "id": user_event_id + user,
+                    "user_id": user + 1,
+                    "event_id": event_id,
+                    "status": "APPROVED",
+                    "is_internal": False,
+                }
+                for user in range(submissions)
+            ],
+        )
+
+    question_ids = [question_id + seq for seq in range(questions)]
+    return question_ids, [user_event_id + user for user in range(submissions)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--submissions", type=int, default=100)
+    args = parser.parse_args()
+
+    seed(users=args.submissions)
+    servicer = ParticipantService()
+    request_type = requestType("SubmitAnswersForEventQuestion")
+    statements = []
+    event.listen(
+        initEngine(),
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    results = []
+    for questions in args.questions:
+        question_ids, user_events_id = createForm(questions, args.submissions)
+        latencies = []
+        del statements[:]
+        for user_event_id in user_events_id:
+            request = request_type(
+                user_event_id=user_event_id,
+                type=1,
+                answers=[
+                    {"question_id": question_id, "value": "3"}
+                    for question_id in question_ids
+                ],
+            )
+            start = time.perf_counter()
+            servicer.SubmitAnswersForEventQuestion(request, Context())
+            latencies.append(time.perf_counter() - start)
+
+        results.append(
+            {
+                "questions": questions,
+                "submissions": len(user_events_id),
+                "statements_per_submission": len(statements) / len(user_events_id),
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+            }
+        )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Builds the suggestion index from synthetic history and times suggestions.
+
+    python -m benchmarks.suggestions --users 100000 --events 10000
+
+Runs entirely in memory; no database is needed beyond importing db_model.
+"""
+
+import argparse
+import json
+import random
+import time
+
+from benchmarks.server_modes import percentile
+from recommender import SuggestionIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--tags", type=int, default=200)
+    parser.add_argument("--tags-per-event", type=int, default=3)
+    parser.add_argument("--events-per-user", type=int, default=10)
+    parser.add_argument("--suggestions", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    events = range(1, args.events + 1)
+    event_tags = [
+        (event_id, tag_id)
+        for event_id in events
+        for tag_id in rng.sample(range(1, args.tags + 1), args.tags_per_event)
+    ]
+    # Skewed attendance so that a hot set of events emerges.
+    weights = [1 / event_id for event_id in events]
+    user_events = [
+        (user_id, event_id)
+        for user_id in range(1, args.users + 1)
+        for event_id in set(rng.choices(events, weights, k=args.events_per_user))
+    ]
+
+    start = time.perf_counter()
+    index = SuggestionIndex(event_tags, user_events)
+    build_seconds = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(args.suggestions):
+        user_id = rng.randint(1, args.users)
+        start = time.perf_counter()
+        index.suggest(user_id, 10)
+        latencies.append(time.perf_counter() - start)
+
+    print(
+        json.dumps(
+            {
+                "users": args.users,
+                "events": args.events,
+                "user_events": len(user_events),
+                "build_seconds": build_seconds,
+                "suggest_p50_ms": percentile(latencies, 50) * 1000,
+                "suggest_p99_ms": percentile(latencies, 99) * 1000,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
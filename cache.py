@@ -0,0 +1,78 @@
+from collections import OrderedDict
+import threading
+import time
+
+import metrics
+
+cache_hits = metrics.Counter(
+    "cache_hits_total", "Cache lookups served from memory.", ["cache"]
+)
+cache_misses = metrics.Counter(
+    "cache_misses_total", "Cache lookups that fell through.", ["cache"]
+)
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire ``ttl`` seconds after being set."""
+
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    @property
+    def generation(self):
+        """Bumped by every ``invalidate`` and ``clear``; see ``set``."""
+        return self._generation
+
+    def get(self, key):
+        return self.getMany([key]).get(key)
+
+    def getMany(self, keys):
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, value = entry
+                if expires_at <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = value
+        cache_hits.inc(len(found), self.name)
+        cache_misses.inc(len(keys) - len(found), self.name)
+        return found
+
+    def set(self, key, value, generation=None):
+        """Stores ``value``, unless the cache was invalidated since ``generation``.
+
+        Read-through callers pass the ``generation`` they saw before loading
+        ``value``, so a value loaded before a concurrent invalidation is not
+        written back over it.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
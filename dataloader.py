@@ -0,0 +1,103 @@
+"""Per-request batch loaders behind the multi-get RPCs.
+
+A DataLoader turns a list of ids into one batch query, however often an id
+repeats, and hands back results in the order the ids were asked for. Create
+one per request: loaded values are kept for the loader's lifetime.
+"""
+
+import grpc
+
+import hts.participant.service_pb2 as participant_service
+from db_model import Event, EventTag, Location, Question, Tag
+from helper import getEventsByIds, getLocation, getQuestion, getStatus, getTag
+
+
+class DataLoader:
+    def __init__(self, batch_load):
+        """``batch_load`` takes a list of unique ids and returns ``{id: value}``."""
+        self.batch_load = batch_load
+        self._values = {}
+
+    def loadMany(self, ids):
+        """Returns the value of every id in order, None where nothing was found."""
+        missing = [key for key in dict.fromkeys(ids) if key not in self._values]
+        if missing:
+            found = self.batch_load(missing)
+            for key in missing:
+                self._values[key] = found.get(key)
+        return [self._values[key] for key in ids]
+
+    def load(self, key):
+        return self.loadMany([key])[0]
+
+
+def eventLoader(session):
+    return DataLoader(
+        lambda events_id: {
+            event.id: event for event in getEventsByIds(events_id, session)
+        }
+    )
+
+
+def locationLoader(session):
+    return DataLoader(
+        lambda locations_id: {
+            location.id: getLocation(location)
+            for location in session.query(Location).filter(
+                Location.id.in_(locations_id)
+            )
+        }
+    )
+
+
+def questionLoader(session):
+    return DataLoader(
+        lambda questions_id: {
+            question.id: getQuestion(question)
+            for question in session.query(Question).filter(
+                Question.id.in_(questions_id)
+            )
+        }
+    )
+
+
+def tagLoader(session):
+    return DataLoader(
+        lambda tags_id: {
+            tag.id: getTag(tag)
+            for tag in session.query(Tag).filter(Tag.id.in_(tags_id))
+        }
+    )
+
+
+def loadEventTags(session, events_id):
+    """Returns ``{event_id: TagsResponse}`` for the events that exist, tagged or not."""
+    tags = {}
+    query_tags = (
+        session.query(Event.id, Tag)
+        .outerjoin(EventTag, EventTag.event_id == Event.id)
+        .outerjoin(Tag, EventTag.tag_id == Tag.id)
+        .filter(Event.id.in_(events_id))
+    )
+    for event_id, tag in query_tags:
+        response = tags.setdefault(event_id, participant_service.TagsResponse())
+        if tag is not None:
+            response.tags.append(getTag(tag))
+    return tags
+
+
+def eventTagsLoader(session):
+    """Loads the TagsResponse of each event id; events without tags get an empty one.
+
+    Unknown events are missing, so multi-gets answer them with NOT_FOUND.
+    """
+    return DataLoader(lambda events_id: loadEventTags(session, events_id))
+
+
+def loadStatuses(loader, ids, not_found_message):
+    """Yields one google.rpc.Status per id, OK with the value or NOT_FOUND."""
+    for value in loader.loadMany(ids):
+        if value is None:
+            yield getStatus(grpc.StatusCode.NOT_FOUND, not_found_message)
+        else:
+            yield getStatus(grpc.StatusCode.OK, detail=value)
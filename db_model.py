@@ -8,9 +8,15 @@ from sqlalchemy import (
     Boolean,
     Enum,
 )
+from sqlalchemy import event, exc, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 import os
+import threading
+import time
+
+import metrics
 
 Base = declarative_base()
 
@@ -19,7 +25,73 @@ password = os.environ.get("POSTGRES_PASSWORD")
 host = os.environ.get("POSTGRES_HOST")
 db = os.environ.get("POSTGRES_DB")
 
-engine = create_engine("postgresql://" + user + ":" + password + "@" + host + "/" + db)
+pool_size = int(os.environ.get("POSTGRES_POOL_SIZE", "10"))
+max_overflow = int(os.environ.get("POSTGRES_MAX_OVERFLOW", "5"))
+pool_timeout = float(os.environ.get("POSTGRES_POOL_TIMEOUT", "30"))
+pool_recycle = int(os.environ.get("POSTGRES_POOL_RECYCLE", "-1"))
+pool_pre_ping = os.environ.get("POSTGRES_POOL_PRE_PING", "false").lower() == "true"
+statement_timeout = int(os.environ.get("POSTGRES_STATEMENT_TIMEOUT", "0"))
+schema_mode = os.environ.get("DB_SCHEMA", "skip")
+
+database_url = os.environ.get("DATABASE_URL")
+
+pool_wait_seconds = metrics.Histogram(
+    "db_pool_wait_seconds", "Time spent waiting for a pooled connection."
+)
+pool_checkout_seconds = metrics.Histogram(
+    "db_pool_checkout_seconds", "Time a connection stays checked out of the pool."
+)
+pool_timeouts = metrics.Counter(
+    "db_pool_timeouts_total", "Checkouts that gave up after POSTGRES_POOL_TIMEOUT."
+)
+
+
+class InstrumentedQueuePool(QueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_timeouts.inc()
+            raise
+        finally:
+            pool_wait_seconds.observe(time.perf_counter() - start)
+
+
+def onCheckout(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info["checkout_time"] = time.perf_counter()
+
+
+def onCheckin(dbapi_connection, connection_record):
+    checkout_time = connection_record.info.pop("checkout_time", None)
+    if checkout_time is not None:
+        pool_checkout_seconds.observe(time.perf_counter() - checkout_time)
+
+
+metrics.Gauge(
+    "db_pool_size",
+    "Connections kept open by the pool.",
+    lambda: engine.pool.size() if engine else 0,
+)
+metrics.Gauge(
+    "db_pool_checked_out",
+    "Connections currently checked out of the pool.",
+    lambda: engine.pool.checkedout() if engine else 0,
+)
+metrics.Gauge(
+    "db_pool_overflow",
+    "Connections opened beyond POSTGRES_POOL_SIZE.",
+    lambda: max(engine.pool.overflow(), 0) if engine else 0,
+)
+
+
+class Organization(Base):
+    __tablename__ = "organization"
+
+    def __str__(self):
+        return str(self.__class__) + ": " + str(self.__dict__)
+
+    id = Column(Integer, primary_key=True)
 
 
 class Event(Base):
@@ -68,7 +140,14 @@ class UserEvent(Base):
     rating = Column(Integer, nullable=True)
     ticket = Column(String, nullable=True)
     status = Column(
-        Enum("PENDING", "APPROVED", "REJECTED", "ATTENDED", name="status_enum", create_type=False)
+        Enum(
+            "PENDING",
+            "APPROVED",
+            "REJECTED",
+            "ATTENDED",
+            name="status_enum",
+            create_type=False,
+        )
     )
     is_internal = Column(Boolean)
 
@@ -203,6 +282,78 @@ class QuestionGroup(Base):
     title = Column(String)
 
 
-Base.metadata.create_all(engine)
+# Bound by initEngine, so importing the models does not touch the database.
+engine = None
+DBSession = sessionmaker()
+_engine_lock = threading.Lock()
+
+
+def createEngine(url, connect_timeout=None, pre_ping=pool_pre_ping):
+    """Creates a pooled engine; ``connect_timeout`` (seconds) only applies to PostgreSQL."""
+    if url.startswith("postgresql"):
+        connect_args = {"options": "-c statement_timeout=%d" % statement_timeout}
+        if connect_timeout is not None:
+            connect_args["connect_timeout"] = connect_timeout
+    elif url.startswith("sqlite"):
+        connect_args = {"check_same_thread": False}
+    else:
+        connect_args = {}
+
+    return create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=pre_ping,
+        connect_args=connect_args,
+    )
+
+
+def initEngine():
+    """Creates the engine from the environment and binds DBSession to it.
+
+    Connections are only opened when first used. Later calls return the same
+    engine.
+    """
+    global engine
+    with _engine_lock:
+        if engine is not None:
+            return engine
 
-DBSession = sessionmaker(bind=engine)
+        new_engine = createEngine(
+            database_url
+            or ("postgresql://" + user + ":" + password + "@" + host + "/" + db)
+        )
+        event.listen(new_engine, "checkout", onCheckout)
+        event.listen(new_engine, "checkin", onCheckin)
+        DBSession.configure(bind=new_engine)
+        engine = new_engine
+        return engine
+
+
+def disposeEngine():
+    """Closes the pooled connections and forgets the engine; initEngine makes a new one."""
+    global engine
+    with _engine_lock:
+        if engine is not None:
+            engine.dispose()
+            engine = None
+            DBSession.configure(bind=None)
+
+
+def prepareSchema(mode=schema_mode):
+    """Applies ``DB_SCHEMA``: ``skip``, ``check`` that every table exists, or ``create`` missing tables."""
+    if mode == "skip":
+        return
+    if mode == "create":
+        Base.metadata.create_all(initEngine())
+    elif mode == "check":
+        missing = set(Base.metadata.tables) - set(
+            inspect(initEngine()).get_table_names()
+        )
+        if missing:
+            raise RuntimeError("Missing tables: " + ", ".join(sorted(missing)))
+    else:
+        raise ValueError("Unknown DB_SCHEMA: " + mode)
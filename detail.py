@@ -0,0 +1,119 @@
+"""Loads the parts of an event page for GetEventDetail.
+
+The event is loaded first (usually from ``event_cache``), so an unknown id
+costs no further queries. Every other part is an independent query, so they
+are loaded concurrently on a shared pool of ``EVENT_DETAIL_WORKERS`` threads,
+each with its own session. The pool also caps how many connections detail
+requests hold at once.
+"""
+
+from concurrent import futures
+import contextvars
+import os
+
+from google.protobuf import json_format
+from google.protobuf.struct_pb2 import Struct
+
+import hts.participant.service_pb2 as participant_service
+from dataloader import loadEventTags
+from db_model import Event, Location
+from helper import (
+    getEventDuration,
+    getEventRatingSummary,
+    getEventsByIds,
+    getLocation,
+    getQuestionGroup,
+)
+from queries import durations_by_event_id, question_groups_by_event_id
+from replicas import ReadSession
+
+detail_workers = int(os.environ.get("EVENT_DETAIL_WORKERS", "4"))
+executor = futures.ThreadPoolExecutor(
+    max_workers=detail_workers, thread_name_prefix="event-detail"
+)
+
+
+def loadEvent(session, event_id):
+    events = getEventsByIds(events_id=[event_id], session=session)
+    return events[0] if events else None
+
+
+def loadDurations(session, event_id):
+    query_event_durations = durations_by_event_id(session).params(event_id=event_id)
+    return participant_service.GetEventDurationsByEventIdResponse(
+        event_durations=map(getEventDuration, query_event_durations)
+    )
+
+
+def loadTags(session, event_id):
+    return loadEventTags(session, [event_id]).get(event_id)
+
+
+def loadLocation(session, event_id):
+    query_location = (
+        session.query(Location)
+        .join(Event, Event.location_id == Location.id)
+        .filter(Event.id == event_id)
+        .scalar()
+    )
+    return getLocation(query_location) if query_location else None
+
+
+def loadQuestionGroups(session, event_id):
+    query_question_groups = question_groups_by_event_id(session).params(
+        event_id=event_id
+    )
+    return participant_service.GetQuestionGroupsByEventIdResponse(
+        question_groups=map(getQuestionGroup, query_question_groups)
+    )
+
+
+# Part name (as used in the field mask and the response) to loader.
+EVENT_DETAIL_PARTS = {
+    "event": loadEvent,
+    "durations": loadDurations,
+    "tags": loadTags,
+    "location": loadLocation,
+    "question_groups": loadQuestionGroups,
+    "rating": getEventRatingSummary,
+}
+
+
+def loadPart(load, event_id):
+    session = ReadSession()
+    try:
+        return load(session, event_id)
+    except:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def getEventDetail(event_id, parts):
+    """Returns a Struct of the named parts, or None when the event does not exist.
+
+    Each part is keyed by its name and holds its message in the proto3 JSON
+    form (``json_format.ParseDict`` turns it back into the message); a part
+    the event does not have, such as its location, is null.
+    """
+    event = loadPart(loadEvent, event_id)
+    if event is None:
+        return None
+
+    pending = {
+        part: executor.submit(
+            contextvars.copy_context().run, loadPart, EVENT_DETAIL_PARTS[part], event_id
+        )
+        for part in parts
+        if part != "event"
+    }
+    detail = Struct()
+    for part in parts:
+        message = event if part == "event" else pending[part].result()
+        detail[part] = (
+            None
+            if message is None
+            else json_format.MessageToDict(message, preserving_proto_field_name=True)
+        )
+    return detail
@@ -0,0 +1,119 @@
+"""RPCs served next to the generated ParticipantService handlers.
+
+service.proto in the api repo does not declare these methods yet. They are
+registered under the same service name with a generic handler and reuse
+existing message types, so clients call them as
+``/hts.participant.ParticipantService/<name>``.
+"""
+
+import grpc
+from google.protobuf import symbol_database
+from google.protobuf.struct_pb2 import Struct
+from google.rpc import status_pb2
+
+import hts.common.common_pb2 as common
+import hts.participant.service_pb2 as participant_service
+
+service = participant_service.DESCRIPTOR.services_by_name["ParticipantService"]
+
+
+def requestType(method):
+    input_type = service.methods_by_name[method].input_type
+    return symbol_database.Default().GetSymbol(input_type.full_name)
+
+
+# (name, handler kind, method whose request type is reused, response type)
+EXTENDED_METHODS = (
+    (
+        "StreamAllEvents",
+        grpc.unary_stream_rpc_method_handler,
+        "GetAllEvents",
+        common.Event,
+    ),
+    (
+        "StreamEventsByStringOfName",
+        grpc.unary_stream_rpc_method_handler,
+        "GetEventsByStringOfName",
+        common.Event,
+    ),
+    (
+        "StreamUserEventsByEventId",
+        grpc.unary_stream_rpc_method_handler,
+        "GetUserEventsByEventId",
+        common.UserEvent,
+    ),
+    (
+        "StreamAnswersByQuestionId",
+        grpc.unary_stream_rpc_method_handler,
+        "GetAnswersByQuestionId",
+        common.Answer,
+    ),
+    (
+        "GetRatingSummaryByEventId",
+        grpc.unary_unary_rpc_method_handler,
+        "GetRatingByEventId",
+        Struct,
+    ),
+    (
+        "BulkJoinEvent",
+        grpc.stream_stream_rpc_method_handler,
+        "JoinEvent",
+        status_pb2.Status,
+    ),
+    (
+        "BulkCancelEvent",
+        grpc.stream_stream_rpc_method_handler,
+        "CancelEvent",
+        status_pb2.Status,
+    ),
+    (
+        "GetEventsByIds",
+        grpc.stream_stream_rpc_method_handler,
+        "GetEventById",
+        status_pb2.Status,
+    ),
+    (
+        "GetLocationsByIds",
+        grpc.stream_stream_rpc_method_handler,
+        "GetLocationById",
+        status_pb2.Status,
+    ),
+    (
+        "GetQuestionsByIds",
+        grpc.stream_stream_rpc_method_handler,
+        "GetQuestionById",
+        status_pb2.Status,
+    ),
+    (
+        "GetTagsByIds",
+        grpc.stream_stream_rpc_method_handler,
+        "GetTagById",
+        status_pb2.Status,
+    ),
+    (
+        "GetTagsByEventIds",
+        grpc.stream_stream_rpc_method_handler,
+        "GetTagsByEventId",
+        status_pb2.Status,
+    ),
+    (
+        "GetEventDetail",
+        grpc.unary_unary_rpc_method_handler,
+        "GetEventById",
+        Struct,
+    ),
+)
+
+
+def addExtendedHandlersToServer(servicer, server):
+    handlers = {
+        name: kind(
+            getattr(servicer, name),
+            request_deserializer=requestType(request_method).FromString,
+            response_serializer=response_type.SerializeToString,
+        )
+        for name, kind, request_method, response_type in EXTENDED_METHODS
+    }
+    server.add_generic_rpc_handlers(
+        (grpc.method_handlers_generic_handler(service.full_name, handlers),)
+    )
@@ -1,11 +1,34 @@
+from collections import namedtuple
 from google.protobuf import wrappers_pb2 as wrapper
+from google.protobuf.any_pb2 import Any
+from google.rpc import status_pb2
+from google.protobuf.struct_pb2 import Struct
 from google.protobuf.timestamp_pb2 import Timestamp
 import base64
-import random
+import os
 import grpc
-from db_model import Event
+from cache import TTLCache
+from db_model import Event, Question, QuestionGroup, UserEvent
 import hts.common.common_pb2 as common
-from sqlalchemy.orm import class_mapper
+from sqlalchemy import and_, func, text
+
+stream_chunk_size = int(os.environ.get("STREAM_CHUNK_SIZE", "500"))
+
+event_cache = TTLCache(
+    "event",
+    maxsize=int(os.environ.get("EVENT_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("EVENT_CACHE_TTL", "60")),
+)
+
+question_schema_cache = TTLCache(
+    "question_schema",
+    maxsize=int(os.environ.get("QUESTION_SCHEMA_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("QUESTION_SCHEMA_CACHE_TTL", "300")),
+)
+
+QuestionSchema = namedtuple(
+    "QuestionSchema", ["question_ids", "required_ids", "answer_types"]
+)
 
 
 def getInt32Value(value):
@@ -37,38 +60,493 @@ def getStringValue(value):
     return temp
 
 
-def getRandomNumber():
-    return round(random.random() * 100)
+def getUserEvent(user_event):
+    return common.UserEvent(
+        id=user_event.id,
+        user_id=user_event.user_id,
+        event_id=user_event.event_id,
+        rating=getInt32Value(user_event.rating),
+        ticket=getStringValue(user_event.ticket),
+        status=user_event.status,
+        is_internal=user_event.is_internal,
+    )
+
+
+def getAnswer(answer):
+    return common.Answer(
+        id=answer.id,
+        user_event_id=answer.user_event_id,
+        question_id=answer.question_id,
+        value=answer.value,
+    )
+
+
+def getLocation(location):
+    return common.Location(
+        id=location.id,
+        name=location.name,
+        google_map_url=location.google_map_url,
+        description=getStringValue(location.description),
+        travel_information_image_url=getStringValue(
+            location.travel_information_image_url
+        ),
+        travel_information_image_hash=getStringValue(
+            location.travel_information_image_hash
+        ),
+        is_online=location.is_online,
+    )
+
+
+def getQuestion(question):
+    return common.Question(
+        id=question.id,
+        question_group_id=question.question_group_id,
+        seq=question.seq,
+        answer_type=question.answer_type,
+        is_optional=question.is_optional,
+        title=question.title,
+        subtitle=question.subtitle,
+    )
+
+
+def getEventDuration(event_duration):
+    return common.EventDuration(
+        id=event_duration.id,
+        event_id=event_duration.event_id,
+        start=getTimeStamp(event_duration.start),
+        finish=getTimeStamp(event_duration.finish),
+    )
+
+
+def getQuestionGroup(question_group):
+    return common.QuestionGroup(
+        id=question_group.id,
+        event_id=question_group.event_id,
+        type=question_group.type,
+        seq=question_group.seq,
+        title=question_group.title,
+    )
+
+
+def getTag(tag):
+    return common.Tag(id=tag.id, name=tag.name)
+
+
+RATING_PERCENTILES = (25, 50, 75, 90, 99)
+
+
+def getRatingSummary(histogram):
+    """Builds the rating summary Struct from ``(rating, count)`` rows.
+
+    Percentiles use the nearest-rank method, so they are always ratings that
+    were actually given. ``mean`` and ``percentiles`` are left out when
+    nobody has rated the event.
+    """
+    histogram = sorted(histogram)
+    count = sum(ratings for _, ratings in histogram)
+    summary = Struct()
+    summary["count"] = count
+    summary["histogram"] = {str(rating): ratings for rating, ratings in histogram}
+    if count:
+        summary["mean"] = sum(rating * ratings for rating, ratings in histogram) / count
+        percentiles = {}
+        for percentile in RATING_PERCENTILES:
+            rank = -(-percentile * count // 100)
+            cumulative = 0
+            for rating, ratings in histogram:
+                cumulative += ratings
+                if cumulative >= rank:
+                    percentiles["p%d" % percentile] = rating
+                    break
+        summary["percentiles"] = percentiles
+    return summary
+
+
+def getEventRatingSummary(session, event_id):
+    """Summarizes an event's ratings from one ``GROUP BY rating`` query."""
+    histogram = (
+        session.query(UserEvent.rating, func.count(UserEvent.id))
+        .filter(UserEvent.event_id == event_id, UserEvent.rating != None)
+        .group_by(UserEvent.rating)
+        .all()
+    )
+    return getRatingSummary(histogram)
+
+
+def getQuestionSchema(session, event_id, question_type):
+    """Returns the QuestionSchema of an event's PRE_EVENT or POST_EVENT questions.
+
+    Schemas are cached per ``(event_id, question_type)``. Questions are
+    edited by another service, so a change is only seen once the entry
+    expires after ``QUESTION_SCHEMA_CACHE_TTL`` seconds.
+    """
+    key = (event_id, question_type)
+    schema = question_schema_cache.get(key)
+    if schema is None:
+        rows = (
+            session.query(Question.id, Question.is_optional, Question.answer_type)
+            .join(QuestionGroup, Question.question_group_id == QuestionGroup.id)
+            .filter(
+                QuestionGroup.event_id == event_id,
+                QuestionGroup.type == question_type,
+            )
+            .all()
+        )
+        schema = QuestionSchema(
+            question_ids=frozenset(row.id for row in rows),
+            required_ids=frozenset(row.id for row in rows if not row.is_optional),
+            answer_types={row.id: row.answer_type for row in rows},
+        )
+        question_schema_cache.set(key, schema)
+    return schema
+
+
+def getAnswerErrors(schema, answers):
+    """Returns why each answer's value does not fit its question's answer type.
+
+    SCALE answers must be integers and answers to required TEXT questions
+    must not be blank.
+    """
+    errors = []
+    for answer in answers:
+        answer_type = schema.answer_types.get(answer.question_id)
+        if answer_type == "SCALE":
+            try:
+                int(answer.value)
+            except ValueError:
+                errors.append(
+                    "answer to question %d must be an integer" % answer.question_id
+                )
+        elif (
+            answer_type == "TEXT"
+            and answer.question_id in schema.required_ids
+            and not answer.value.strip()
+        ):
+            errors.append("answer to question %d is required" % answer.question_id)
+    return errors
+
+
+def insertReturning(session, model, rows):
+    """Inserts ``rows`` with a single multi-VALUES INSERT and returns the new rows.
+
+    SQLite (used by the benchmarks) has no RETURNING in this SQLAlchemy
+    version and does not promise consecutive ids for a multi-row insert, so
+    there each row is inserted on its own and rebuilt with its new id.
+    """
+    if not rows:
+        return []
+    table = model.__table__
+    if session.get_bind().dialect.implicit_returning:
+        statement = table.insert().values(rows).returning(*table.columns)
+        return session.execute(statement).fetchall()
+    return [
+        model(
+            id=session.execute(table.insert().values(row)).inserted_primary_key[0],
+            **row
+        )
+        for row in rows
+    ]
+
+
+# First key of the two-key advisory locks that serialize joins per event.
+JOIN_LOCK_NAMESPACE = 0x6A6F696E
+
+JOIN_EVENT_STATEMENT = """
+INSERT INTO user_event (user_id, event_id, status, is_internal)
+SELECT :user_id, event.id, 'PENDING', false
+FROM event
+WHERE event.id = :event_id
+  AND NOT EXISTS (
+    SELECT 1 FROM user_event
+    WHERE user_event.user_id = :user_id AND user_event.event_id = :event_id
+  )
+  AND (
+    coalesce(event.attendee_limit, 0) <= 0
+    OR (
+      SELECT count(*) FROM user_event
+      WHERE user_event.event_id = :event_id
+        AND user_event.is_internal = false
+        AND user_event.status != 'REJECTED'
+    ) < event.attendee_limit
+  )
+RETURNING id, user_id, event_id, rating, ticket, status, is_internal
+"""
+
+
+JOIN_LOCK_STATEMENT = "SELECT pg_advisory_xact_lock(:lock_namespace, :event_id)"
+
+# Volatile functions in the select list run after the sort, so the locks are
+# taken in id order.
+JOIN_LOCKS_STATEMENT = """
+SELECT pg_advisory_xact_lock(:lock_namespace, id)
+FROM unnest(CAST(:events_id AS integer[])) AS id
+ORDER BY id
+"""
+
+
+def lockEvent(session, event_id):
+    """Takes the per-event join lock of ``event_id`` until the transaction ends.
+
+    Only PostgreSQL has advisory locks; elsewhere this does nothing.
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    session.execute(
+        text(JOIN_LOCK_STATEMENT),
+        {"lock_namespace": JOIN_LOCK_NAMESPACE, "event_id": event_id},
+    )
+
+
+def insertUserEvent(session, user_id, event_id):
+    """Adds a PENDING user_event unless it exists or the event is full.
+
+    Returns the new row, or None when nothing was inserted. Non-internal,
+    non-rejected user_events count towards ``attendee_limit`` (no limit when
+    it is 0 or NULL). On PostgreSQL the check and insert run after the
+    per-event join lock, so concurrent joins can neither duplicate nor
+    overbook; SQLite serializes writers on its own.
+    """
+    lockEvent(session, event_id)
+    return session.execute(
+        text(JOIN_EVENT_STATEMENT), {"user_id": user_id, "event_id": event_id}
+    ).first()
+
+
+def lockEvents(session, events_id):
+    """Takes the per-event join locks of ``events_id`` in one statement.
+
+    Locks are taken in id order so that concurrent batches cannot deadlock.
+    """
+    if session.get_bind().dialect.name != "postgresql" or not events_id:
+        return
+    session.execute(
+        text(JOIN_LOCKS_STATEMENT),
+        {"lock_namespace": JOIN_LOCK_NAMESPACE, "events_id": sorted(set(events_id))},
+    )
+
+
+def getEventSeats(session, events_id):
+    """Returns ``{event_id: (attendee_limit, seats taken)}``, counted like insertUserEvent."""
+    rows = (
+        session.query(Event.id, Event.attendee_limit, func.count(UserEvent.id))
+        .outerjoin(
+            UserEvent,
+            and_(
+                UserEvent.event_id == Event.id,
+                UserEvent.is_internal == False,
+                UserEvent.status != "REJECTED",
+            ),
+        )
+        .filter(Event.id.in_(set(events_id)))
+        .group_by(Event.id, Event.attendee_limit)
+        .all()
+    )
+    return {
+        event_id: (attendee_limit, taken) for event_id, attendee_limit, taken in rows
+    }
+
+
+def getStatus(code, message="", detail=None, details=()):
+    """Builds a google.rpc.Status, packing ``detail`` and then ``details`` into Any."""
+    status = status_pb2.Status(code=code.value[0], message=message)
+    for value in ([detail] if detail is not None else []) + list(details):
+        any_detail = Any()
+        any_detail.Pack(value)
+        status.details.append(any_detail)
+    return status
+
+
+def encodePageToken(kind, position):
+    return str(base64.urlsafe_b64encode(("%s:%d" % (kind, position)).encode()), "utf-8")
+
+
+def decodePageToken(page_token, kind):
+    """Returns the position in a ``kind`` page token; raises ValueError for any other token."""
+    token_kind, _, position = (
+        base64.urlsafe_b64decode(page_token.encode("ascii")).decode().partition(":")
+    )
+    if token_kind != kind:
+        raise ValueError("not a %s page token" % kind)
+    return int(position)
+
+
+def getPageRequest(context, kind):
+    """Returns the ``page-size`` (0 when absent) and the position in ``page-token``.
+
+    Callers opt in to paging with ``page-size`` and pass the
+    ``next-page-token`` trailing metadata of the previous page back as
+    ``page-token``. Tokens are opaque to clients; ``kind`` names what the
+    position means (a keyset id or an offset), so a token from another kind
+    of listing is rejected with INVALID_ARGUMENT like a malformed one.
+    """
+    metadata = dict(context.invocation_metadata())
+    try:
+        page_size = int(metadata.get("page-size", "0"))
+    except ValueError:
+        throwError(
+            "page-size must be an integer.", grpc.StatusCode.INVALID_ARGUMENT, context
+        )
+
+    page_token = metadata.get("page-token")
+    if not page_token:
+        return page_size, None
+    try:
+        return page_size, decodePageToken(page_token, kind)
+    except ValueError:
+        throwError("Invalid page-token.", grpc.StatusCode.INVALID_ARGUMENT, context)
+
+
+def setNextPageToken(context, kind, position):
+    context.set_trailing_metadata(
+        (("next-page-token", encodePageToken(kind, position)),)
+    )
+
+
+def paginate(query, key_column, context):
+    """Returns the rows of ``query``, one keyset page at a time if the caller asked for it.
+
+    Without ``page-size`` every row is returned.
+    """
+    page_size, after = getPageRequest(context, "after")
+    if page_size <= 0:
+        return query.all()
+
+    query = query.order_by(key_column)
+    if after is not None:
+        query = query.filter(key_column > after)
+
+    rows = query.limit(page_size).all()
+    if len(rows) == page_size:
+        setNextPageToken(context, "after", getattr(rows[-1], key_column.key))
+    return rows
+
+
+def streamQuery(query):
+    """Iterates ``query`` from a server-side cursor, ``stream_chunk_size`` rows at a time."""
+    return query.execution_options(stream_results=True).yield_per(stream_chunk_size)
+
+
+class ServiceError(Exception):
+    """Ends an RPC with ``code`` and ``details``; raised by throwError.
+
+    The servers turn it into ``context.abort``, so both modes send the same
+    status and an expected error is not logged as a crash.
+    """
+
+    def __init__(self, code, details):
+        super().__init__(details)
+        self.code = code
+        self.details = details
 
 
 def throwError(details: str, statusCode: grpc.StatusCode, context):
     context.set_code(statusCode)
     context.set_details(details)
-    return proto_pb2.Response()
-
-
-def getEventsByIds(events_id: [str], session):
-    events = []
-
-    query_events = session.query(Event).filter(Event.id.in_(events_id)).all()
-    if query_events is not None:
-        events = map(
-            lambda event: common.Event(
-                id=event.id,
-                organization_id=event.organization_id,
-                location_id=getInt32Value(event.location_id),
-                description=event.description,
-                name=event.name,
-                cover_image_url=getStringValue(event.cover_image_url),
-                cover_image_hash=getStringValue(event.cover_image_hash),
-                poster_image_url=getStringValue(event.poster_image_url),
-                poster_image_hash=getStringValue(event.poster_image_hash),
-                profile_image_url=getStringValue(event.profile_image_url),
-                profile_image_hash=getStringValue(event.profile_image_hash),
-                attendee_limit=event.attendee_limit,
-                contact=getStringValue(event.contact),
-            ),
-            query_events,
+    raise ServiceError(statusCode, details)
+
+
+EVENT_COLUMNS = (
+    "id",
+    "organization_id",
+    "location_id",
+    "description",
+    "name",
+    "cover_image_url",
+    "cover_image_hash",
+    "poster_image_url",
+    "poster_image_hash",
+    "profile_image_url",
+    "profile_image_hash",
+    "attendee_limit",
+    "contact",
+    "registration_due_date",
+)
+
+
+def setField(name):
+    return lambda message, value: setattr(message, name, value)
+
+
+def setWrapperField(name):
+    def setter(message, value):
+        getattr(message, name).value = value
+
+    return setter
+
+
+def setTimestampField(name):
+    return lambda message, value: getattr(message, name).FromDatetime(value)
+
+
+event_field_setters = {name: setField(name) for name in EVENT_COLUMNS}
+event_field_setters.update(
+    {
+        name: setWrapperField(name)
+        for name in (
+            "location_id",
+            "cover_image_url",
+            "cover_image_hash",
+            "poster_image_url",
+            "poster_image_hash",
+            "profile_image_url",
+            "profile_image_hash",
+            "contact",
         )
+    }
+)
+event_field_setters["registration_due_date"] = setTimestampField(
+    "registration_due_date"
+)
+
+
+def queryEvents(session, columns=EVENT_COLUMNS):
+    """Selects ``columns`` of Event as plain tuples, skipping ORM hydration."""
+    return session.query(*[getattr(Event, column) for column in columns])
+
+
+def getEvents(rows, columns=EVENT_COLUMNS, events=None):
+    """Builds common.Event messages from ``rows`` fetched by queryEvents.
+
+    Fields are set in place on each message, so no wrapper or Timestamp is
+    allocated per field. Pass a repeated field as ``events`` to build the
+    messages directly inside a response.
+    """
+    setters = [event_field_setters[column] for column in columns]
+    messages = []
+    for row in rows:
+        message = common.Event() if events is None else events.add()
+        for setter, value in zip(setters, row):
+            if value is not None:
+                setter(message, value)
+        messages.append(message)
+    return messages
+
+
+def getEventsByIds(events_id: [int], session):
+    """Returns events in the order of ``events_id``, skipping duplicates and unknown ids.
+
+    Events are served from ``event_cache`` as serialized protobufs; only the
+    misses are loaded, with a single ``IN`` query. They are not cached when
+    an invalidation ran while they were being loaded.
+    """
+    events_id = list(dict.fromkeys(events_id))
+    generation = event_cache.generation
+    cached = event_cache.getMany(events_id)
+
+    missing = [event_id for event_id in events_id if event_id not in cached]
+    if missing:
+        rows = queryEvents(session).filter(Event.id.in_(missing))
+        for event in getEvents(rows):
+            data = event.SerializeToString()
+            event_cache.set(event.id, data, generation)
+            cached[event.id] = data
+
+    return [
+        common.Event.FromString(cached[event_id])
+        for event_id in events_id
+        if event_id in cached
+    ]
+
 
-    return events
+def invalidateEvents(*events_id):
+    event_cache.invalidate(*events_id)
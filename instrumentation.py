@@ -0,0 +1,296 @@
+"""Per-RPC latency, database work and response size metrics.
+
+A server interceptor starts an RpcStats for every call and keeps it in a
+ContextVar. The SQLAlchemy cursor hooks below add each statement's time and
+row count to whichever RpcStats is current, so queries are attributed to the
+RPC that ran them. Rows are the DB-API ``rowcount``: rows returned by a
+SELECT on PostgreSQL, rows changed by a write (SQLite reports no count for
+SELECTs).
+
+Calls picked by ``profiling.shouldProfile`` also collect every statement
+and run their handler under cProfile via ``profiled``, one call per process
+at a time.
+"""
+
+import cProfile
+import contextvars
+import logging
+import threading
+import time
+
+import grpc
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import metrics
+import profiling
+
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 1000, 10000, 100000)
+BYTE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+rpc_handled = metrics.Counter(
+    "grpc_server_handled_total", "RPCs completed, by status code.", ["method", "code"]
+)
+rpc_seconds = metrics.Histogram(
+    "grpc_server_handling_seconds", "Time spent handling an RPC.", ["method"]
+)
+rpc_queries = metrics.Histogram(
+    "grpc_server_db_queries", "SQL statements run per RPC.", ["method"], COUNT_BUCKETS
+)
+rpc_query_seconds = metrics.Histogram(
+    "grpc_server_db_query_seconds", "Time spent in SQL per RPC.", ["method"]
+)
+rpc_rows = metrics.Histogram(
+    "grpc_server_db_rows",
+    "Rows returned or changed per RPC.",
+    ["method"],
+    COUNT_BUCKETS,
+)
+rpc_response_bytes = metrics.Histogram(
+    "grpc_server_response_bytes",
+    "Serialized size of all responses of an RPC.",
+    ["method"],
+    BYTE_BUCKETS,
+)
+
+rpc_stats = contextvars.ContextVar("rpc_stats", default=None)
+
+# Held while a call runs under its profiler; see profiled.
+_profile_lock = threading.Lock()
+
+
+class RpcStats:
+    def __init__(self, method, profile=False):
+        self.method = method
+        self.profile = cProfile.Profile() if profile else None
+        self.statements = [] if profile else None
+        self.profile_used = False
+        self.code = None
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.rows = 0
+        self.response_bytes = 0
+        self.started_at = time.perf_counter()
+
+    def addResponse(self, response):
+        if response is not None:
+            self.response_bytes += response.ByteSize()
+        return response
+
+    def record(self, failed):
+        if self.code is not None:
+            code = self.code.name
+        else:
+            code = "UNKNOWN" if failed else "OK"
+        rpc_handled.inc(1, self.method, code)
+        rpc_seconds.observe(time.perf_counter() - self.started_at, self.method)
+        rpc_queries.observe(self.queries, self.method)
+        rpc_query_seconds.observe(self.query_seconds, self.method)
+        rpc_rows.observe(self.rows, self.method)
+        rpc_response_bytes.observe(self.response_bytes, self.method)
+        if self.profile_used:
+            profiling.writeProfile(self.method, self.profile, self.statements)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def startQuery(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append((context, time.perf_counter()))
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def finishQuery(conn, cursor, statement, parameters, context, executemany):
+    _, started_at = conn.info["query_started_at"].pop()
+    elapsed = time.perf_counter() - started_at
+    stats = rpc_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+        stats.rows += max(cursor.rowcount, 0)
+        if stats.statements is not None:
+            stats.statements.append((elapsed, cursor.rowcount, statement))
+
+
+@event.listens_for(Engine, "handle_error")
+def failQuery(exception_context):
+    # A statement that fails gets no after_cursor_execute, so its start is
+    # dropped here; errors raised before startQuery ran have none to drop.
+    connection = exception_context.connection
+    started = connection.info.get("query_started_at") if connection else None
+    if started and started[-1][0] is exception_context.execution_context:
+        started.pop()
+
+
+def profiled(function, *args):
+    """Calls ``function``, under the current RPC's profiler if it has one.
+
+    Only one call per process is profiled at a time: from Python 3.12 a
+    second active cProfile raises, and earlier the profilers would slow each
+    other down. Calls arriving while another one is profiled, or whose
+    profiler fails to start, run unprofiled; profiler errors never reach
+    the handler.
+    """
+    stats = rpc_stats.get()
+    if stats is None or stats.profile is None:
+        return function(*args)
+    if not _profile_lock.acquire(blocking=False):
+        return function(*args)
+    try:
+        stats.profile.enable()
+    except Exception:
+        _profile_lock.release()
+        logging.warning("Could not profile %s", stats.method, exc_info=True)
+        return function(*args)
+    stats.profile_used = True
+    try:
+        return function(*args)
+    finally:
+        try:
+            stats.profile.disable()
+        except Exception:
+            logging.warning("Could not stop profiling %s", stats.method, exc_info=True)
+        _profile_lock.release()
+
+
+def closeStream(responses):
+    """Closes a handler's response generator, running its ``finally`` blocks.
+
+    Registered as a termination callback of streaming calls: a client that
+    cancels a stream would otherwise leave the generator, its session and
+    any server-side cursor open until garbage collection.
+    """
+    try:
+        responses.close()
+    except ValueError:
+        # Still running on a handler thread; it stops after this response.
+        pass
+
+
+class RecordingContext:
+    """Passes through to the grpc context, remembering the status code set on it."""
+
+    def __init__(self, context, stats):
+        self._context = context
+        self._stats = stats
+
+    def set_code(self, code):
+        self._stats.code = code
+        self._context.set_code(code)
+
+    def __getattr__(self, name):
+        return getattr(self._context, name)
+
+
+def startStats(handler_call_details):
+    return RpcStats(
+        handler_call_details.method.rsplit("/", 1)[-1],
+        profiling.shouldProfile(handler_call_details.invocation_metadata),
+    )
+
+
+def replaceBehavior(handler, wrap, wrap_stream):
+    if handler.unary_unary:
+        return handler._replace(unary_unary=wrap(handler.unary_unary))
+    if handler.stream_unary:
+        return handler._replace(stream_unary=wrap(handler.stream_unary))
+    if handler.unary_stream:
+        return handler._replace(unary_stream=wrap_stream(handler.unary_stream))
+    return handler._replace(stream_stream=wrap_stream(handler.stream_stream))
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        def wrap(behavior):
+            def observed(request, context):
+                stats = startStats(handler_call_details)
+                token = rpc_stats.set(stats)
+                failed = True
+                try:
+                    response = stats.addResponse(
+                        profiled(behavior, request, RecordingContext(context, stats))
+                    )
+                    failed = False
+                    return response
+                finally:
+                    rpc_stats.reset(token)
+                    stats.record(failed)
+
+            return observed
+
+        def wrap_stream(behavior):
+            def observed(request, context):
+                # The stats are only current while the handler runs, since
+                # the stream may be closed from another thread.
+                stats = startStats(handler_call_details)
+                failed = True
+                try:
+                    responses = behavior(request, RecordingContext(context, stats))
+                    context.add_callback(lambda: closeStream(responses))
+                    while True:
+                        token = rpc_stats.set(stats)
+                        try:
+                            response = profiled(next, responses, None)
+                        finally:
+                            rpc_stats.reset(token)
+                        if response is None:
+                            break
+                        yield stats.addResponse(response)
+                    failed = False
+                finally:
+                    stats.record(failed)
+
+            return observed
+
+        return replaceBehavior(handler, wrap, wrap_stream)
+
+
+class AioMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """Like MetricsInterceptor; the handlers profile themselves with ``profiled``."""
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        def wrap(behavior):
+            async def observed(request, context):
+                stats = startStats(handler_call_details)
+                token = rpc_stats.set(stats)
+                failed = True
+                try:
+                    response = stats.addResponse(
+                        await behavior(request, RecordingContext(context, stats))
+                    )
+                    failed = False
+                    return response
+                finally:
+                    rpc_stats.reset(token)
+                    stats.record(failed)
+
+            return observed
+
+        def wrap_stream(behavior):
+            async def observed(request, context):
+                stats = startStats(handler_call_details)
+                failed = True
+                try:
+                    responses = behavior(request, RecordingContext(context, stats))
+                    while True:
+                        token = rpc_stats.set(stats)
+                        try:
+                            response = await responses.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            rpc_stats.reset(token)
+                        yield stats.addResponse(response)
+                    failed = False
+                finally:
+                    stats.record(failed)
+
+            return observed
+
+        return replaceBehavior(handler, wrap, wrap_stream)
@@ -1,8 +1,15 @@
 from concurrent import futures
+import asyncio
+import contextvars
+import gc
+import inspect
 import logging
 import os
+import signal
+import time
 
 import grpc
+import metrics
 import hts.common.common_pb2 as common
 import hts.participant.service_pb2 as participant_service
 import hts.participant.service_pb2_grpc as participant_service_grpc
@@ -18,23 +25,78 @@ from db_model import (
     Answer,
     Location,
     User,
-    QuestionGroup,
-    Question,
+    disposeEngine,
+    initEngine,
+    prepareSchema,
 )
 from helper import (
+    ServiceError,
     getInt32Value,
     b64encode,
     getStringValue,
-    getRandomNumber,
     throwError,
     getEventsByIds,
     getTimeStamp,
+    getEvents,
+    queryEvents,
+    getUserEvent,
+    getAnswer,
+    insertReturning,
+    getQuestionSchema,
+    getAnswerErrors,
+    insertUserEvent,
+    lockEvents,
+    getEventSeats,
+    getStatus,
+    getLocation,
+    getQuestion,
+    getTag,
+    getEventDuration,
+    getQuestionGroup,
+    getEventRatingSummary,
+    paginate,
+    streamQuery,
+    getPageRequest,
+    setNextPageToken,
 )
-from datetime import datetime
-from google.protobuf.timestamp_pb2 import Timestamp
+from extensions import addExtendedHandlersToServer
+from instrumentation import (
+    AioMetricsInterceptor,
+    MetricsInterceptor,
+    closeStream,
+    profiled,
+)
+from prefork import superviseWorkers
+from queries import (
+    answers_by_user_event_id,
+    durations_by_event_id,
+    location_by_id,
+    question_by_id,
+    question_groups_by_event_id,
+    questions_by_question_group_id,
+    ratings_by_event_id,
+    tag_by_id,
+    tags_by_event_id,
+    user_answer_by_question_id,
+    user_event_by_user_and_event_id,
+)
+from replicas import ReadSession, read_replicas
+from detail import EVENT_DETAIL_PARTS, getEventDetail
+from dataloader import (
+    eventLoader,
+    eventTagsLoader,
+    loadStatuses,
+    locationLoader,
+    questionLoader,
+    tagLoader,
+)
+from recommender import suggestion_engine
+from search import event_search
+from schedule import event_calendar
+from datetime import datetime, timedelta
+from google.protobuf.empty_pb2 import Empty
 from google.protobuf.wrappers_pb2 import BoolValue
-from sqlalchemy import func, or_
-import random
+from sqlalchemy import func, tuple_
 
 
 class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
@@ -75,43 +137,36 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             user_id = request.user_id
             event_id = request.event_id
 
-            query_user_event = session.query(UserEvent).filter(
-                UserEvent.user_id == user_id, UserEvent.event_id == event_id
-            )
+            added_user_event = insertUserEvent(session, user_id, event_id)
+            session.commit()
 
-            if query_user_event.scalar():
+            if added_user_event:
+                return getUserEvent(added_user_event)
+
+            query_event = (
+                session.query(
+                    Event.id,
+                    session.query(UserEvent)
+                    .filter(
+                        UserEvent.user_id == user_id, UserEvent.event_id == event_id
+                    )
+                    .exists(),
+                )
+                .filter(Event.id == event_id)
+                .first()
+            )
+            if query_event is None:
+                throwError("Event not found.", grpc.StatusCode.NOT_FOUND, context)
+            elif query_event[1]:
                 throwError(
                     "User already send request to this event.",
                     grpc.StatusCode.ALREADY_EXISTS,
                     context,
                 )
-
-            new_user_event = UserEvent(
-                user_id=user_id,
-                event_id=event_id,
-                rating=None,
-                ticket=None,
-                status="PENDING",
-                is_internal=False,
-            )
-            session.add(new_user_event)
-            session.commit()
-
-            added_user_event = query_user_event.scalar()
-
-            if added_user_event:
-                return common.UserEvent(
-                    id=added_user_event.id,
-                    user_id=added_user_event.user_id,
-                    event_id=added_user_event.event_id,
-                    rating=getInt32Value(added_user_event.rating),
-                    ticket=getStringValue(added_user_event.ticket),
-                    status=added_user_event.status,
-                    is_internal=added_user_event.is_internal,
+            else:
+                throwError(
+                    "Event is full.", grpc.StatusCode.FAILED_PRECONDITION, context
                 )
-            throwError(
-                "Database didn't update User Event.", grpc.StatusCode.INTERNAL, context
-            )
         except:
             session.rollback()
             raise
@@ -131,27 +186,13 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             )
 
             if query_user_event:
-                event = session.query(Event).filter(Event.id == event_id).scalar()
-
                 session.delete(query_user_event)
                 session.commit()
 
-                return common.Event(
-                    id=event.id,
-                    organization_id=event.organization_id,
-                    location_id=getInt32Value(event.location_id),
-                    description=event.description,
-                    name=event.name,
-                    cover_image_url=getStringValue(event.cover_image_url),
-                    cover_image_hash=getStringValue(event.cover_image_hash),
-                    poster_image_url=getStringValue(event.poster_image_url),
-                    poster_image_hash=getStringValue(event.poster_image_hash),
-                    profile_image_url=getStringValue(event.profile_image_url),
-                    profile_image_hash=getStringValue(event.profile_image_hash),
-                    attendee_limit=event.attendee_limit,
-                    contact=getStringValue(event.contact),
-                    registration_due_date=getTimeStamp(event.registration_due_date),
-                )
+                events = getEventsByIds(events_id=[event_id], session=session)
+                if events:
+                    return events[0]
+                throwError("Event not found.", grpc.StatusCode.NOT_FOUND, context)
 
             throwError(
                 "User have not yet request to join this event.",
@@ -164,6 +205,127 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
         finally:
             session.close()
 
+    def BulkJoinEvent(self, request_iterator, context):
+        session = DBSession()
+        try:
+            pairs = [
+                (request.user_id, request.event_id) for request in request_iterator
+            ]
+            events_id = {event_id for _, event_id in pairs}
+
+            lockEvents(session, events_id)
+            seats = getEventSeats(session, events_id)
+            joined = set()
+            if pairs:
+                joined.update(
+                    session.query(UserEvent.user_id, UserEvent.event_id).filter(
+                        tuple_(UserEvent.user_id, UserEvent.event_id).in_(set(pairs))
+                    )
+                )
+
+            # Items are admitted in request order; None marks a successful join.
+            statuses = []
+            new_pairs = []
+            for pair in pairs:
+                user_id, event_id = pair
+                if event_id not in seats:
+                    statuses.append(
+                        getStatus(grpc.StatusCode.NOT_FOUND, "Event not found.")
+                    )
+                    continue
+                if pair in joined:
+                    statuses.append(
+                        getStatus(
+                            grpc.StatusCode.ALREADY_EXISTS,
+                            "User already send request to this event.",
+                        )
+                    )
+                    continue
+                attendee_limit, taken = seats[event_id]
+                if attendee_limit and attendee_limit > 0 and taken >= attendee_limit:
+                    statuses.append(
+                        getStatus(grpc.StatusCode.FAILED_PRECONDITION, "Event is full.")
+                    )
+                    continue
+                seats[event_id] = (attendee_limit, taken + 1)
+                joined.add(pair)
+                new_pairs.append(pair)
+                statuses.append(None)
+
+            added_user_events = insertReturning(
+                session,
+                UserEvent,
+                [
+                    {
+                        "user_id": user_id,
+                        "event_id": event_id,
+                        "status": "PENDING",
+                        "is_internal": False,
+                    }
+                    for user_id, event_id in new_pairs
+                ],
+            )
+            session.commit()
+
+            added = {
+                (user_event.user_id, user_event.event_id): user_event
+                for user_event in added_user_events
+            }
+            for pair, status in zip(pairs, statuses):
+                yield status or getStatus(
+                    grpc.StatusCode.OK, detail=getUserEvent(added[pair])
+                )
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def BulkCancelEvent(self, request_iterator, context):
+        session = DBSession()
+        try:
+            pairs = [
+                (request.user_id, request.event_id) for request in request_iterator
+            ]
+
+            user_events = {}
+            if pairs:
+                for user_event_id, user_id, event_id in session.query(
+                    UserEvent.id, UserEvent.user_id, UserEvent.event_id
+                ).filter(tuple_(UserEvent.user_id, UserEvent.event_id).in_(set(pairs))):
+                    user_events[(user_id, event_id)] = user_event_id
+            if user_events:
+                session.query(UserEvent).filter(
+                    UserEvent.id.in_(user_events.values())
+                ).delete(synchronize_session=False)
+            session.commit()
+
+            # Each cancelled event is looked up once, however many users left it.
+            events = {
+                event.id: event
+                for event in getEventsByIds(
+                    events_id=[event_id for _, event_id in user_events], session=session
+                )
+            }
+
+            cancelled = set()
+            for pair in pairs:
+                if pair not in user_events or pair in cancelled:
+                    yield getStatus(
+                        grpc.StatusCode.NOT_FOUND,
+                        "User have not yet request to join this event.",
+                    )
+                elif pair[1] not in events:
+                    yield getStatus(grpc.StatusCode.NOT_FOUND, "Event not found.")
+                else:
+                    cancelled.add(pair)
+                    yield getStatus(grpc.StatusCode.OK, detail=events[pair[1]])
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
     def SubmitAnswersForEventQuestion(self, request, context):
         session = DBSession()
         try:
@@ -182,57 +344,35 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
                 )
 
             user_event_id = request.user_event_id
-            user_event = (
-                session.query(UserEvent).filter(UserEvent.id == user_event_id).scalar()
+            # The user_event's event, once per question it has already answered.
+            query_user_event = (
+                session.query(UserEvent.event_id, Answer.question_id)
+                .outerjoin(Answer, Answer.user_event_id == UserEvent.id)
+                .filter(UserEvent.id == user_event_id)
+                .all()
             )
-            if user_event is None:
-                throwError("Did not find any user_event for ID " + str(user_event_id) + ".", grpc.StatusCode.NOT_FOUND, context)
-
-            query = (
-                session.query(Answer, Question, QuestionGroup)
-                .filter(
-                    Question.question_group_id == QuestionGroup.id,
-                    Answer.question_id == Question.id,
-                )
-                .filter(
-                    Answer.user_event_id == user_event_id,
-                    QuestionGroup.type == question_type,
+            if not query_user_event:
+                throwError(
+                    "Did not find any user_event for ID " + str(user_event_id) + ".",
+                    grpc.StatusCode.NOT_FOUND,
+                    context,
                 )
-                .all()
+
+            schema = getQuestionSchema(
+                session, query_user_event[0].event_id, question_type
             )
 
-            if query:
+            if schema.question_ids.intersection(
+                question_id for _, question_id in query_user_event
+            ):
                 throwError(
                     "User already submit the answers for this event.",
                     grpc.StatusCode.ALREADY_EXISTS,
                     context,
                 )
 
-            query_question = session.query(QuestionGroup, Question).filter(
-                Question.question_group_id == QuestionGroup.id,
-                QuestionGroup.event_id == user_event.event_id,
-                QuestionGroup.type == question_type,
-            )
-
-            query_required_question = query_question.filter(
-                Question.is_optional == False
-            )
-
-            query_question_id = list(
-                map(lambda question: question.Question.id, query_question)
-            )
-            query_required_question_id = list(
-                map(lambda question: question.Question.id, query_required_question)
-            )
-
-            print(
-                "expect: "
-                + str(query_question_id)
-                + " or "
-                + str(query_required_question_id)
-                + " got "
-                + str(question_ids)
-            )
+            query_question_id = sorted(schema.question_ids)
+            query_required_question_id = sorted(schema.required_ids)
 
             if not (
                 set(query_required_question_id).issubset(set(question_ids))
@@ -249,33 +389,30 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
                     context,
                 )
 
-            for answer in answers:
-                question_id = answer.question_id
-                question_answer = answer.value
-                new_answer = Answer(
-                    user_event_id=user_event_id,
-                    question_id=question_id,
-                    value=question_answer,
+            answer_errors = getAnswerErrors(schema, answers)
+            if answer_errors:
+                throwError(
+                    "; ".join(answer_errors),
+                    grpc.StatusCode.INVALID_ARGUMENT,
+                    context,
                 )
-                session.add(new_answer)
-                session.commit()
 
-            query_answers = session.query(Answer).filter(
-                Answer.user_event_id == user_event_id
-            )
-
-            data = map(
-                lambda result: common.Answer(
-                    id=result.id,
-                    user_event_id=result.user_event_id,
-                    question_id=result.question_id,
-                    value=result.value,
-                ),
-                query_answers.all(),
+            new_answers = insertReturning(
+                session,
+                Answer,
+                [
+                    {
+                        "user_event_id": user_event_id,
+                        "question_id": answer.question_id,
+                        "value": answer.value,
+                    }
+                    for answer in answers
+                ],
             )
+            session.commit()
 
             return participant_service.SubmitAnswerForEventQuestionResponse(
-                answers=data
+                answers=map(getAnswer, new_answers)
             )
         except:
             session.rollback()
@@ -284,31 +421,12 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetEventById(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
-            query_event = (
-                session.query(Event).filter(Event.id == request.event_id).scalar()
-            )
+            events = getEventsByIds(events_id=[request.event_id], session=session)
 
-            if query_event is not None:
-                return common.Event(
-                    id=query_event.id,
-                    organization_id=query_event.organization_id,
-                    location_id=getInt32Value(query_event.location_id),
-                    description=query_event.description,
-                    name=query_event.name,
-                    cover_image_url=getStringValue(query_event.cover_image_url),
-                    cover_image_hash=getStringValue(query_event.cover_image_hash),
-                    poster_image_url=getStringValue(query_event.poster_image_url),
-                    poster_image_hash=getStringValue(query_event.poster_image_hash),
-                    profile_image_url=getStringValue(query_event.profile_image_url),
-                    profile_image_hash=getStringValue(query_event.profile_image_hash),
-                    attendee_limit=query_event.attendee_limit,
-                    contact=getStringValue(query_event.contact),
-                    registration_due_date=getTimeStamp(
-                        query_event.registration_due_date
-                    ),
-                )
+            if events:
+                return events[0]
 
             throwError("Event not found.", grpc.StatusCode.NOT_FOUND, context)
         except:
@@ -317,31 +435,115 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
         finally:
             session.close()
 
-    def GetAllEvents(self, request, context):
-        session = DBSession()
+    def GetEventsByIds(self, request_iterator, context):
+        session = ReadSession()
         try:
-            query_events = session.query(Event).all()
-
-            data = map(
-                lambda event: common.Event(
-                    id=event.id,
-                    organization_id=event.organization_id,
-                    location_id=getInt32Value(event.location_id),
-                    description=event.description,
-                    name=event.name,
-                    cover_image_url=getStringValue(event.cover_image_url),
-                    cover_image_hash=getStringValue(event.cover_image_hash),
-                    poster_image_url=getStringValue(event.poster_image_url),
-                    poster_image_hash=getStringValue(event.poster_image_hash),
-                    profile_image_url=getStringValue(event.profile_image_url),
-                    profile_image_hash=getStringValue(event.profile_image_hash),
-                    attendee_limit=event.attendee_limit,
-                    contact=getStringValue(event.contact),
-                    registration_due_date=getTimeStamp(event.registration_due_date),
-                ),
-                query_events,
+            yield from loadStatuses(
+                eventLoader(session),
+                [request.event_id for request in request_iterator],
+                "Event not found.",
+            )
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def GetLocationsByIds(self, request_iterator, context):
+        session = ReadSession()
+        try:
+            yield from loadStatuses(
+                locationLoader(session),
+                [request.id for request in request_iterator],
+                "No location found with given location_id",
+            )
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def GetQuestionsByIds(self, request_iterator, context):
+        session = ReadSession()
+        try:
+            yield from loadStatuses(
+                questionLoader(session),
+                [request.id for request in request_iterator],
+                "No Question found",
+            )
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def GetTagsByIds(self, request_iterator, context):
+        session = ReadSession()
+        try:
+            yield from loadStatuses(
+                tagLoader(session),
+                [request.id for request in request_iterator],
+                "Tag not found",
+            )
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def GetTagsByEventIds(self, request_iterator, context):
+        session = ReadSession()
+        try:
+            yield from loadStatuses(
+                eventTagsLoader(session),
+                [request.id for request in request_iterator],
+                "Event not found.",
+            )
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def GetEventDetail(self, request, context):
+        metadata = dict(context.invocation_metadata())
+        field_mask = metadata.get("field-mask")
+        if field_mask:
+            parts = [part.strip() for part in field_mask.split(",") if part.strip()]
+        else:
+            parts = list(EVENT_DETAIL_PARTS)
+
+        unknown_parts = [part for part in parts if part not in EVENT_DETAIL_PARTS]
+        if unknown_parts:
+            throwError(
+                "Unknown event detail parts: " + ", ".join(unknown_parts),
+                grpc.StatusCode.INVALID_ARGUMENT,
+                context,
             )
-            return participant_service.EventsResponse(event=data)
+
+        detail = getEventDetail(request.event_id, parts)
+        if detail is None:
+            throwError("Event not found.", grpc.StatusCode.NOT_FOUND, context)
+        return detail
+
+    def GetAllEvents(self, request, context):
+        session = ReadSession()
+        try:
+            response = participant_service.EventsResponse()
+            rows = paginate(queryEvents(session), Event.id, context)
+            getEvents(rows, events=response.event)
+            return response
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def StreamAllEvents(self, request, context):
+        session = ReadSession()
+        try:
+            for row in streamQuery(queryEvents(session).order_by(Event.id)):
+                yield getEvents((row,))[0]
         except:
             session.rollback()
             raise
@@ -349,12 +551,12 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetTagById(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
-            query_tag = session.query(Tag).filter(Tag.id == request.id).scalar()
+            query_tag = tag_by_id(session).params(id=request.id).scalar()
 
             if query_tag:
-                return common.Tag(id=query_tag.id, name=query_tag.name)
+                return getTag(query_tag)
             throwError("Tag not found", grpc.StatusCode.NOT_FOUND, context)
         except:
             session.rollback()
@@ -363,11 +565,11 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetAllTags(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             query_tags = session.query(Tag).all()
 
-            data = map(lambda tag: common.Tag(id=tag.id, name=tag.name), query_tags)
+            data = map(getTag, query_tags)
             return participant_service.TagsResponse(tags=data)
         except:
             session.rollback()
@@ -376,46 +578,22 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetSuggestedEvents(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
-            events = []
-
-            for i in range(0, 10):
-                query_event = (
-                    session.query(Event).filter(Event.id == getRandomNumber()).scalar()
-                )
-                if query_event is not None:
-                    events.append(
-                        common.Event(
-                            id=query_event.id,
-                            organization_id=query_event.organization_id,
-                            location_id=getInt32Value(query_event.location_id),
-                            description=query_event.description,
-                            name=query_event.name,
-                            cover_image_url=getStringValue(query_event.cover_image_url),
-                            cover_image_hash=getStringValue(
-                                query_event.cover_image_hash
-                            ),
-                            poster_image_url=getStringValue(
-                                query_event.poster_image_url
-                            ),
-                            poster_image_hash=getStringValue(
-                                query_event.poster_image_hash
-                            ),
-                            profile_image_url=getStringValue(
-                                query_event.profile_image_url
-                            ),
-                            profile_image_hash=getStringValue(
-                                query_event.profile_image_hash
-                            ),
-                            attendee_limit=query_event.attendee_limit,
-                            contact=getStringValue(query_event.contact),
-                            registration_due_date=getTimeStamp(
-                                query_event.registration_due_date
-                            ),
-                        )
+            user_id = dict(context.invocation_metadata()).get("user-id")
+            if user_id is not None:
+                try:
+                    user_id = int(user_id)
+                except ValueError:
+                    throwError(
+                        "user-id must be an integer.",
+                        grpc.StatusCode.INVALID_ARGUMENT,
+                        context,
                     )
 
+            events_id = suggestion_engine.suggest(user_id, suggestion_count)
+            events = getEventsByIds(events_id=events_id, session=session)
+
             return participant_service.EventsResponse(event=events)
         except:
             session.rollback()
@@ -424,28 +602,12 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetUpcomingEvents(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
-            start = request.start.seconds
-            end = request.end.seconds
-            text = [float(start), float(end)]
-
-            start_date = datetime.fromtimestamp(text[0])
-            end_date = datetime.fromtimestamp(text[1])
-
-            query_event_durations = (
-                session.query(EventDuration)
-                .filter(
-                    EventDuration.start >= start_date, EventDuration.start < end_date
-                )
-                .all()
-            )
-
-            date_events = []
-            events_id = map(
-                lambda event_duration: (event_duration.event_id), query_event_durations
-            )
+            start_date = datetime.fromtimestamp(float(request.start.seconds))
+            end_date = datetime.fromtimestamp(float(request.end.seconds))
 
+            events_id = event_calendar.getIndex().startingBetween(start_date, end_date)
             date_events = getEventsByIds(events_id=events_id, session=session)
 
             return participant_service.EventsResponse(event=date_events)
@@ -456,40 +618,19 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetOnlineEvents(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             number_of_events = request.n
 
             query_events = (
-                (
-                    session.query(Event, Location)
-                    .filter(Event.location_id == Location.id)
-                    .filter(Location.is_online == True)
-                )
+                session.query(Event.id)
+                .filter(Event.location_id == Location.id)
+                .filter(Location.is_online == True)
                 .limit(number_of_events)
-                .all()
             )
 
-            events = map(
-                lambda event: common.Event(
-                    id=event.Event.id,
-                    organization_id=event.Event.organization_id,
-                    location_id=getInt32Value(event.Event.location_id),
-                    description=event.Event.description,
-                    name=event.Event.name,
-                    cover_image_url=getStringValue(event.Event.cover_image_url),
-                    cover_image_hash=getStringValue(event.Event.cover_image_hash),
-                    poster_image_url=getStringValue(event.Event.poster_image_url),
-                    poster_image_hash=getStringValue(event.Event.poster_image_hash),
-                    profile_image_url=getStringValue(event.Event.profile_image_url),
-                    profile_image_hash=getStringValue(event.Event.profile_image_hash),
-                    attendee_limit=event.Event.attendee_limit,
-                    contact=getStringValue(event.Event.contact),
-                    registration_due_date=getTimeStamp(
-                        event.Event.registration_due_date
-                    ),
-                ),
-                query_events,
+            events = getEventsByIds(
+                events_id=[event_id for (event_id,) in query_events], session=session
             )
 
             return participant_service.EventsResponse(event=events)
@@ -500,40 +641,19 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetOnSiteEvents(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             number_of_events = request.n
 
             query_events = (
-                (
-                    session.query(Event, Location)
-                    .filter(Event.location_id == Location.id)
-                    .filter(Location.is_online == False)
-                )
+                session.query(Event.id)
+                .filter(Event.location_id == Location.id)
+                .filter(Location.is_online == False)
                 .limit(number_of_events)
-                .all()
             )
 
-            events = map(
-                lambda event: common.Event(
-                    id=event.Event.id,
-                    organization_id=event.Event.organization_id,
-                    location_id=getInt32Value(event.Event.location_id),
-                    description=event.Event.description,
-                    name=event.Event.name,
-                    cover_image_url=getStringValue(event.Event.cover_image_url),
-                    cover_image_hash=getStringValue(event.Event.cover_image_hash),
-                    poster_image_url=getStringValue(event.Event.poster_image_url),
-                    poster_image_hash=getStringValue(event.Event.poster_image_hash),
-                    profile_image_url=getStringValue(event.Event.profile_image_url),
-                    profile_image_hash=getStringValue(event.Event.profile_image_hash),
-                    attendee_limit=event.Event.attendee_limit,
-                    contact=getStringValue(event.Event.contact),
-                    registration_due_date=getTimeStamp(
-                        event.Event.registration_due_date
-                    ),
-                ),
-                query_events,
+            events = getEventsByIds(
+                events_id=[event_id for (event_id,) in query_events], session=session
             )
 
             return participant_service.EventsResponse(event=events)
@@ -544,37 +664,50 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetEventsByStringOfName(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             text = request.text.lower()
+            response = participant_service.EventsResponse()
             if text == "":
-                results = session.query(Event).all()
-            else:
-                results = session.query(Event).filter(
+                rows = paginate(queryEvents(session), Event.id, context)
+                getEvents(rows, events=response.event)
+                return response
+
+            page_size, offset = getPageRequest(context, "offset")
+            if page_size <= 0:
+                # Every event whose name contains the text, as before paging.
+                rows = queryEvents(session).filter(
                     func.lower(Event.name).contains(text)
                 )
+                getEvents(rows, events=response.event)
+                return response
 
-            events = map(
-                lambda event: common.Event(
-                    id=event.id,
-                    organization_id=event.organization_id,
-                    location_id=getInt32Value(event.location_id),
-                    description=event.description,
-                    name=event.name,
-                    cover_image_url=getStringValue(event.cover_image_url),
-                    cover_image_hash=getStringValue(event.cover_image_hash),
-                    poster_image_url=getStringValue(event.poster_image_url),
-                    poster_image_hash=getStringValue(event.poster_image_hash),
-                    profile_image_url=getStringValue(event.profile_image_url),
-                    profile_image_hash=getStringValue(event.profile_image_hash),
-                    attendee_limit=event.attendee_limit,
-                    contact=getStringValue(event.contact),
-                    registration_due_date=getTimeStamp(event.registration_due_date),
-                ),
-                results,
+            offset = offset or 0
+            events_id = event_search.search(text, offset + page_size + 1)
+            if len(events_id) > offset + page_size:
+                setNextPageToken(context, "offset", offset + page_size)
+
+            response.event.extend(
+                getEventsByIds(
+                    events_id=events_id[offset : offset + page_size], session=session
+                )
             )
+            return response
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
 
-            return participant_service.EventsResponse(event=events)
+    def StreamEventsByStringOfName(self, request, context):
+        session = ReadSession()
+        try:
+            text = request.text.lower()
+            results = queryEvents(session).order_by(Event.id)
+            if text != "":
+                results = results.filter(func.lower(Event.name).contains(text))
+            for row in streamQuery(results):
+                yield getEvents((row,))[0]
         except:
             session.rollback()
             raise
@@ -582,7 +715,7 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetEventsByTagIds(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             tag_id = request.tag_ids
 
@@ -602,7 +735,7 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetEventsByFacilityId(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             facility_id = request.id
 
@@ -626,34 +759,16 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetEventsByOrganizationId(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             organization_id = request.id
 
-            query_events = (
-                session.query(Event)
-                .filter(Event.organization_id == organization_id)
-                .all()
+            query_events = session.query(Event.id).filter(
+                Event.organization_id == organization_id
             )
 
-            events = map(
-                lambda event: common.Event(
-                    id=event.id,
-                    organization_id=event.organization_id,
-                    location_id=getInt32Value(event.location_id),
-                    description=event.description,
-                    name=event.name,
-                    cover_image_url=getStringValue(event.cover_image_url),
-                    cover_image_hash=getStringValue(event.cover_image_hash),
-                    poster_image_url=getStringValue(event.poster_image_url),
-                    poster_image_hash=getStringValue(event.poster_image_hash),
-                    profile_image_url=getStringValue(event.profile_image_url),
-                    profile_image_hash=getStringValue(event.profile_image_hash),
-                    attendee_limit=event.attendee_limit,
-                    contact=getStringValue(event.contact),
-                    registration_due_date=getTimeStamp(event.registration_due_date),
-                ),
-                query_events,
+            events = getEventsByIds(
+                events_id=[event_id for (event_id,) in query_events], session=session
             )
 
             return participant_service.EventsResponse(event=events)
@@ -664,26 +779,13 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetEventsByDate(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
-            timestamp = request.seconds
-            text = float(timestamp)
-
-            date = datetime.fromtimestamp(text)
-            start_date = datetime(date.year, date.month, date.day, 0, 0, 0)
-            end_date = datetime(date.year, date.month, date.day + 1, 0, 0, 0)
-
-            query_event_durations = (
-                session.query(EventDuration)
-                .filter(
-                    EventDuration.start >= start_date, EventDuration.start < end_date
-                )
-                .all()
-            )
+            date = datetime.fromtimestamp(float(request.seconds))
+            start_date = datetime(date.year, date.month, date.day)
+            end_date = start_date + timedelta(days=1)
 
-            events_id = map(
-                lambda event_duration: event_duration.event_id, query_event_durations
-            )
+            events_id = event_calendar.getIndex().overlapping(start_date, end_date)
             date_events = getEventsByIds(events_id=events_id, session=session)
 
             return participant_service.EventsResponse(event=date_events)
@@ -694,26 +796,14 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetLocationById(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             id = request.id
 
-            query_location = session.query(Location).filter(Location.id == id).scalar()
+            query_location = location_by_id(session).params(id=id).scalar()
 
             if query_location:
-                return common.Location(
-                    id=query_location.id,
-                    name=query_location.name,
-                    google_map_url=query_location.google_map_url,
-                    description=getStringValue(query_location.description),
-                    travel_information_image_url=getStringValue(
-                        query_location.travel_information_image_url
-                    ),
-                    travel_information_image_hash=getStringValue(
-                        query_location.travel_information_image_hash
-                    ),
-                    is_online=query_location.is_online,
-                )
+                return getLocation(query_location)
             throwError(
                 "No location found with given location_id",
                 grpc.StatusCode.NOT_FOUND,
@@ -726,22 +816,13 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetTagsByEventId(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             event_id = request.id
-            tags_id = []
-            tags_of_event = []
 
-            event_tags = (
-                session.query(EventTag).filter(EventTag.event_id == event_id).all()
-            )
-            for event_tag in event_tags:
-                tags_id.append(event_tag.tag_id)
+            query_tags = tags_by_event_id(session).params(event_id=event_id)
 
-            for tag_id in tags_id:
-                tag = session.query(Tag).filter(Tag.id == tag_id).scalar()
-                if tag is not None:
-                    tags_of_event.append(common.Tag(id=tag.id, name=tag.name))
+            tags_of_event = map(getTag, query_tags)
             return participant_service.TagsResponse(tags=tags_of_event)
         except:
             session.rollback()
@@ -750,20 +831,14 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetRatingByEventId(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             event_id = request.id
-            ratings = []
 
-            query_user_events = (
-                session.query(UserEvent).filter(UserEvent.event_id == event_id).all()
-            )
+            query_ratings = ratings_by_event_id(session).params(event_id=event_id).all()
 
-            if query_user_events:
-                for user_event in query_user_events:
-                    temp = user_event.rating
-                    if temp is not None:
-                        ratings.append(temp)
+            if query_ratings:
+                ratings = [rating for rating, in query_ratings if rating is not None]
                 return participant_service.GetRatingByEventIdResponse(result=ratings)
             throwError("No rating found for event.", grpc.StatusCode.NOT_FOUND, context)
         except:
@@ -772,8 +847,18 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
         finally:
             session.close()
 
+    def GetRatingSummaryByEventId(self, request, context):
+        session = ReadSession()
+        try:
+            return getEventRatingSummary(session, request.id)
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
     def GetUsersByEventId(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             event_id = request.event_id
             status = request.status
@@ -831,27 +916,18 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetEventDurationsByEventId(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             event_id = request.id
             event_durations = []
 
             query_event_durations = (
-                session.query(EventDuration)
-                .filter(EventDuration.event_id == event_id)
-                .all()
+                durations_by_event_id(session).params(event_id=event_id).all()
             )
 
             if query_event_durations:
                 for event_duration in query_event_durations:
-                    event_durations.append(
-                        common.EventDuration(
-                            id=event_duration.id,
-                            event_id=event_duration.event_id,
-                            start=getTimeStamp(event_duration.start),
-                            finish=getTimeStamp(event_duration.finish),
-                        )
-                    )
+                    event_durations.append(getEventDuration(event_duration))
             return participant_service.GetEventDurationsByEventIdResponse(
                 event_durations=event_durations
             )
@@ -862,26 +938,16 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetQuestionById(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             question_id = request.id
 
-            query_question = (
-                session.query(Question).filter(Question.id == question_id).scalar()
-            )
+            query_question = question_by_id(session).params(id=question_id).scalar()
 
             if query_question is None:
                 throwError("No Question found", grpc.StatusCode.NOT_FOUND, context)
 
-            return common.Question(
-                id=query_question.id,
-                question_group_id=query_question.question_group_id,
-                seq=query_question.seq,
-                answer_type=query_question.answer_type,
-                is_optional=query_question.is_optional,
-                title=query_question.title,
-                subtitle=query_question.subtitle,
-            )
+            return getQuestion(query_question)
 
         except:
             session.rollback()
@@ -890,15 +956,13 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetQuestionGroupsByEventId(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             event_id = request.id
             question_groups = []
 
             query_question_groups = (
-                session.query(QuestionGroup)
-                .filter(QuestionGroup.event_id == event_id)
-                .all()
+                question_groups_by_event_id(session).params(event_id=event_id).all()
             )
 
             if query_question_groups is None:
@@ -907,15 +971,7 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
                 )
 
             for question_group_query in query_question_groups:
-                question_groups.append(
-                    common.QuestionGroup(
-                        id=question_group_query.id,
-                        event_id=question_group_query.event_id,
-                        type=question_group_query.type,
-                        seq=question_group_query.seq,
-                        title=question_group_query.title,
-                    )
-                )
+                question_groups.append(getQuestionGroup(question_group_query))
             return participant_service.GetQuestionGroupsByEventIdResponse(
                 question_groups=question_groups
             )
@@ -927,14 +983,14 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetQuestionsByQuestionGroupId(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             question_group_id = request.id
             questions = []
 
             query_questions = (
-                session.query(Question)
-                .filter(Question.question_group_id == question_group_id)
+                questions_by_question_group_id(session)
+                .params(question_group_id=question_group_id)
                 .all()
             )
 
@@ -944,17 +1000,7 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
                 )
 
             for question_query in query_questions:
-                questions.append(
-                    common.Question(
-                        id=question_query.id,
-                        question_group_id=question_query.question_group_id,
-                        seq=question_query.seq,
-                        answer_type=question_query.answer_type,
-                        is_optional=question_query.is_optional,
-                        title=question_query.title,
-                        subtitle=question_query.subtitle,
-                    )
-                )
+                questions.append(getQuestion(question_query))
             return participant_service.GetQuestionsByQuestionGroupIdResponse(
                 questions=questions
             )
@@ -966,25 +1012,17 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetAnswersByQuestionId(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             question_id = request.id
-            answers = []
 
-            query_answers = (
-                session.query(Answer).filter(Answer.question_id == question_id).all()
+            query_answers = paginate(
+                session.query(Answer).filter(Answer.question_id == question_id),
+                Answer.id,
+                context,
             )
 
-            if query_answers:
-                answers = map(
-                    lambda answer: common.Answer(
-                        id=answer.id,
-                        user_event_id=answer.user_event_id,
-                        question_id=answer.question_id,
-                        value=answer.value,
-                    ),
-                    query_answers,
-                )
+            answers = map(getAnswer, query_answers)
 
             return participant_service.AnswersResponse(answers=answers)
         except:
@@ -993,6 +1031,23 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
         finally:
             session.close()
 
+    def StreamAnswersByQuestionId(self, request, context):
+        session = ReadSession()
+        try:
+            query_answers = (
+                session.query(Answer)
+                .filter(Answer.question_id == request.id)
+                .order_by(Answer.id)
+            )
+
+            for answer in streamQuery(query_answers):
+                yield getAnswer(answer)
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
     def GetAnswersByUserEventId(self, request, context):
         session = DBSession()
         try:
@@ -1000,8 +1055,8 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             answers = []
 
             query_answers = (
-                session.query(Answer)
-                .filter(Answer.user_event_id == user_event_id)
+                answers_by_user_event_id(session)
+                .params(user_event_id=user_event_id)
                 .all()
             )
 
@@ -1028,24 +1083,10 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
         try:
             user_id = request.user_id
             question_id = request.question_id
-            selected_user_event_id = []
-
-            query_user_events = (
-                session.query(UserEvent)
-                .filter(UserEvent.user_id == user_id, UserEvent.is_internal == False)
-                .all()
-            )
-
-            selected_user_event_id = map(
-                lambda query_user_event: query_user_event.id, query_user_events
-            )
 
             query_answer = (
-                session.query(Answer)
-                .filter(
-                    Answer.question_id == question_id,
-                    Answer.user_event_id.in_(selected_user_event_id),
-                )
+                user_answer_by_question_id(session)
+                .params(question_id=question_id, user_id=user_id)
                 .scalar()
             )
 
@@ -1070,22 +1111,13 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             user_id = request.user_id
             event_id = request.event_id
 
-            query_user_event = session.query(UserEvent).filter(
-                UserEvent.user_id == user_id,
-                UserEvent.event_id == event_id,
-                UserEvent.is_internal == False,
+            user_event = (
+                user_event_by_user_and_event_id(session)
+                .params(user_id=user_id, event_id=event_id)
+                .scalar()
             )
-            if query_user_event.scalar():
-                user_event = query_user_event.scalar()
-                return common.UserEvent(
-                    id=user_event.id,
-                    user_id=user_event.user_id,
-                    event_id=user_event.event_id,
-                    rating=getInt32Value(user_event.rating),
-                    ticket=getStringValue(user_event.ticket),
-                    status=user_event.status,
-                    is_internal=user_event.is_internal,
-                )
+            if user_event:
+                return getUserEvent(user_event)
             throwError("User Event not found", grpc.StatusCode.NOT_FOUND, context)
         except:
             session.rollback()
@@ -1099,33 +1131,15 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             user_id = request.user_id
 
             query_user_events = (
-                session.query(UserEvent, Event)
+                session.query(UserEvent.event_id)
                 .filter(UserEvent.event_id == Event.id)
                 .filter(UserEvent.user_id == user_id)
                 .filter(UserEvent.is_internal == False)
-                .all()
             )
 
-            events = map(
-                lambda event: common.Event(
-                    id=event.Event.id,
-                    organization_id=event.Event.organization_id,
-                    location_id=getInt32Value(event.Event.location_id),
-                    description=event.Event.description,
-                    name=event.Event.name,
-                    cover_image_url=getStringValue(event.Event.cover_image_url),
-                    cover_image_hash=getStringValue(event.Event.cover_image_hash),
-                    poster_image_url=getStringValue(event.Event.poster_image_url),
-                    poster_image_hash=getStringValue(event.Event.poster_image_hash),
-                    profile_image_url=getStringValue(event.Event.profile_image_url),
-                    profile_image_hash=getStringValue(event.Event.profile_image_hash),
-                    attendee_limit=event.Event.attendee_limit,
-                    contact=getStringValue(event.Event.contact),
-                    registration_due_date=getTimeStamp(
-                        event.Event.registration_due_date
-                    ),
-                ),
-                query_user_events,
+            events = getEventsByIds(
+                events_id=[event_id for (event_id,) in query_user_events],
+                session=session,
             )
 
             return participant_service.EventsResponse(event=events)
@@ -1137,28 +1151,19 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
             session.close()
 
     def GetUserEventsByEventId(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             event_id = request.id
 
-            query_user_event = (
-                session.query(UserEvent)
-                .filter(UserEvent.event_id == event_id, UserEvent.is_internal == False)
-                .all()
-            )
-
-            chosen_user_events = map(
-                lambda user_event: common.UserEvent(
-                    id=user_event.id,
-                    user_id=user_event.user_id,
-                    event_id=user_event.event_id,
-                    rating=getInt32Value(user_event.rating),
-                    ticket=getStringValue(user_event.ticket),
-                    status=user_event.status,
-                    is_internal=user_event.is_internal,
+            query_user_event = paginate(
+                session.query(UserEvent).filter(
+                    UserEvent.event_id == event_id, UserEvent.is_internal == False
                 ),
-                query_user_event,
+                UserEvent.id,
+                context,
             )
+
+            chosen_user_events = map(getUserEvent, query_user_event)
             return participant_service.GetUserEventsByEventIdResponse(
                 user_events=chosen_user_events
             )
@@ -1168,44 +1173,43 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
         finally:
             session.close()
 
+    def StreamUserEventsByEventId(self, request, context):
+        session = ReadSession()
+        try:
+            query_user_event = (
+                session.query(UserEvent)
+                .filter(
+                    UserEvent.event_id == request.id, UserEvent.is_internal == False
+                )
+                .order_by(UserEvent.id)
+            )
+
+            for user_event in streamQuery(query_user_event):
+                yield getUserEvent(user_event)
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
     def GetPastEventsFromTags(self, request, context):
-        session = DBSession()
+        session = ReadSession()
         try:
             tag_id = request.tag_id
             number_of_events = request.number_of_events
 
-            query_events = (
-                session.query(Event)
-                .join(EventTag)
-                .filter(EventTag.tag_id.in_(tag_id))
-                .all()
-            )
-
-            if len(query_events) > number_of_events:
-                random_number = random.randint(0, len(query_events) - number_of_events)
-                query_events = query_events[
-                    random_number : random_number + number_of_events
+            events_id = suggestion_engine.sampleTagged(tag_id, number_of_events)
+            if events_id is None:
+                # The tag index is still being built: any tagged events, unsorted.
+                events_id = [
+                    event_id
+                    for (event_id,) in session.query(EventTag.event_id)
+                    .filter(EventTag.tag_id.in_(tag_id))
+                    .distinct()
+                    .limit(number_of_events)
                 ]
 
-            events = map(
-                lambda event: common.Event(
-                    id=event.id,
-                    organization_id=event.organization_id,
-                    location_id=getInt32Value(event.location_id),
-                    description=event.description,
-                    name=event.name,
-                    cover_image_url=getStringValue(event.cover_image_url),
-                    cover_image_hash=getStringValue(event.cover_image_hash),
-                    poster_image_url=getStringValue(event.poster_image_url),
-                    poster_image_hash=getStringValue(event.poster_image_hash),
-                    profile_image_url=getStringValue(event.profile_image_url),
-                    profile_image_hash=getStringValue(event.profile_image_hash),
-                    attendee_limit=event.attendee_limit,
-                    contact=getStringValue(event.contact),
-                    registration_due_date=getTimeStamp(event.registration_due_date),
-                ),
-                query_events,
-            )
+            events = getEventsByIds(events_id=events_id, session=session)
 
             return participant_service.EventsResponse(event=events)
 
@@ -1284,16 +1288,316 @@ class ParticipantService(participant_service_grpc.ParticipantServiceServicer):
 
 
 port = os.environ.get("GRPC_PORT")
+server_mode = os.environ.get("GRPC_SERVER_MODE", "thread")
+max_workers = int(os.environ.get("GRPC_MAX_WORKERS", "10"))
+processes = int(os.environ.get("GRPC_PROCESSES", "1"))
+max_concurrent_rpcs = int(os.environ.get("GRPC_MAX_CONCURRENT_RPCS", "0")) or None
+shutdown_grace = float(os.environ.get("GRPC_SHUTDOWN_GRACE", "10"))
+metrics_port = os.environ.get("METRICS_PORT")
+suggestion_count = int(os.environ.get("SUGGESTION_COUNT", "10"))
+
+startup_seconds = metrics.Counter(
+    "startup_seconds_total", "Time spent in each startup phase.", ["phase"]
+)
 
 
-def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    participant_service_grpc.add_ParticipantServiceServicer_to_server(
-        ParticipantService(), server
+class AsyncParticipantService:
+    """Exposes every ParticipantService handler as a coroutine for grpc.aio.
+
+    The handlers themselves stay synchronous (SQLAlchemy 1.3 has no asyncio
+    support), so each call is awaited on ``executor``. This is a transport
+    change only: at most ``GRPC_MAX_WORKERS`` handlers run at once, as in
+    thread mode, and calls beyond that wait for a free executor thread. Only
+    the network I/O moves to the event loop, so a streamed response does not
+    hold a thread while the client is slow to read it. Streamed requests are
+    read in full before the handler runs, and handlers run in a copy of the
+    caller's contextvars so per-RPC instrumentation follows them onto the
+    executor.
+    """
+
+    def __init__(self, servicer, executor):
+        self._servicer = servicer
+        self._executor = executor
+
+    def __getattr__(self, name):
+        handler = getattr(self._servicer, name)
+
+        async def read(request):
+            if hasattr(request, "__aiter__"):
+                return [item async for item in request]
+            return request
+
+        if inspect.isgeneratorfunction(handler):
+
+            async def stream(request, context):
+                loop = asyncio.get_running_loop()
+                run = contextvars.copy_context().run
+                responses = handler(await read(request), context)
+                done = object()
+                try:
+                    while True:
+                        response = await loop.run_in_executor(
+                            self._executor, run, profiled, next, responses, done
+                        )
+                        if response is done:
+                            return
+                        yield response
+                except ServiceError as error:
+                    await context.abort(error.code, error.details)
+                finally:
+                    # Also reached when the client cancels the call.
+                    closeStream(responses)
+
+            return stream
+
+        async def coroutine(request, context):
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(
+                    self._executor,
+                    contextvars.copy_context().run,
+                    profiled,
+                    handler,
+                    await read(request),
+                    context,
+                )
+            except ServiceError as error:
+                await context.abort(error.code, error.details)
+
+        return coroutine
+
+
+class ThreadedParticipantService:
+    """Exposes every ParticipantService handler to the threaded grpc server.
+
+    A ServiceError from throwError becomes ``context.abort``, as in
+    AsyncParticipantService, so the status is sent without grpc logging
+    the handler as crashed.
+    """
+
+    def __init__(self, servicer):
+        self._servicer = servicer
+
+    def __getattr__(self, name):
+        handler = getattr(self._servicer, name)
+
+        if inspect.isgeneratorfunction(handler):
+
+            def stream(request, context):
+                try:
+                    yield from handler(request, context)
+                except ServiceError as error:
+                    context.abort(error.code, error.details)
+
+            return stream
+
+        def unary(request, context):
+            try:
+                return handler(request, context)
+            except ServiceError as error:
+                context.abort(error.code, error.details)
+
+        return unary
+
+
+def createThreadedServer(options=()):
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=max_workers),
+        interceptors=(MetricsInterceptor(),),
+        options=options,
+        maximum_concurrent_rpcs=max_concurrent_rpcs,
+    )
+    servicer = ThreadedParticipantService(ParticipantService())
+    participant_service_grpc.add_ParticipantServiceServicer_to_server(servicer, server)
+    addExtendedHandlersToServer(servicer, server)
+    return server
+
+
+def createAioServer(options=()):
+    executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+    server = grpc.aio.server(
+        migration_thread_pool=executor,
+        interceptors=(AioMetricsInterceptor(),),
+        options=options,
+        maximum_concurrent_rpcs=max_concurrent_rpcs,
     )
+    servicer = AsyncParticipantService(ParticipantService(), executor)
+    participant_service_grpc.add_ParticipantServiceServicer_to_server(servicer, server)
+    addExtendedHandlersToServer(servicer, server)
+    return server
+
+
+def serveThreaded(startup, options, started, private=False):
+    server = createThreadedServer(options)
     server.add_insecure_port("[::]:" + port)
+    # Unlike the shared port, this one reaches only this process's server.
+    private_port = server.add_insecure_port("localhost:0") if private else None
     server.start()
+    startup.finish("server")
+    started(private_port)
+
+    def drain(signum, frame):
+        logging.info("Draining in-flight RPCs for up to %ss", shutdown_grace)
+        server.stop(shutdown_grace)
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, drain)
     server.wait_for_termination()
 
 
-serve()
+async def serveAio(startup, options, started, private=False):
+    server = createAioServer(options)
+    server.add_insecure_port("[::]:" + port)
+    # Unlike the shared port, this one reaches only this process's server.
+    private_port = server.add_insecure_port("localhost:0") if private else None
+    await server.start()
+    startup.finish("server")
+    started(private_port)
+
+    def drain():
+        logging.info("Draining in-flight RPCs for up to %ss", shutdown_grace)
+        asyncio.ensure_future(server.stop(shutdown_grace))
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, drain)
+    await server.wait_for_termination()
+
+
+class Startup:
+    """Times the startup phases; ``finish`` logs each one and the total so far."""
+
+    def __init__(self):
+        self.started_at = self.phase_started_at = time.perf_counter()
+
+    def finish(self, phase):
+        now = time.perf_counter()
+        startup_seconds.inc(now - self.phase_started_at, phase)
+        logging.info(
+            "Startup phase %s took %.3fs (%.3fs total)",
+            phase,
+            now - self.phase_started_at,
+            now - self.started_at,
+        )
+        self.phase_started_at = now
+
+
+def pinger(private_port):
+    """Returns ``ping(timeout)``, which raises unless the server on ``private_port`` handles a Ping."""
+    stub = participant_service_grpc.ParticipantServiceStub(
+        grpc.insecure_channel("localhost:%d" % private_port)
+    )
+
+    def ping(timeout):
+        try:
+            stub.Ping(Empty(), timeout=timeout)
+        except grpc.RpcError as error:
+            # Shedding calls over GRPC_MAX_CONCURRENT_RPCS still means handling them.
+            if error.code() != grpc.StatusCode.RESOURCE_EXHAUSTED:
+                raise
+
+    return ping
+
+
+def runServer(startup, worker_index=None, serving=None):
+    """Runs the phases after config.
+
+    In prefork workers ``worker_index`` is set and ``serving`` starts the
+    heartbeat once the server is up.
+    """
+    if metrics_port:
+        metrics.startHttpServer(int(metrics_port) + (worker_index or 0))
+    initEngine()
+    startup.finish("engine")
+    read_replicas.start()
+    startup.finish("replicas")
+    if worker_index is None:
+        prepareSchema()
+        startup.finish("schema")
+
+    # The indexes are built in the background once the port is bound, so a
+    # slow or unavailable database delays them instead of the server.
+    refreshes = []
+
+    def started(private_port):
+        refreshes.extend(
+            [
+                suggestion_engine.start(),
+                event_search.start(),
+                event_calendar.start(),
+            ]
+        )
+        if serving is not None:
+            serving(pinger(private_port))
+
+    # Workers share the port; the kernel balances connections between them.
+    options = () if worker_index is None else (("grpc.so_reuseport", 1),)
+    private = serving is not None
+    try:
+        if server_mode == "aio":
+            asyncio.run(serveAio(startup, options, started, private))
+        else:
+            serveThreaded(startup, options, started, private)
+    finally:
+        for stopped in refreshes:
+            stopped.set()
+        read_replicas.stop()
+        disposeEngine()
+        logging.info("Stopped")
+
+
+def runWorker(worker_index, serving):
+    runServer(Startup(), worker_index, serving)
+
+
+def preloadIndexes():
+    """Builds the indexes in the prefork parent, for the workers to inherit.
+
+    Workers then start with the parent's copy and only reload it after a
+    random part of the refresh interval. An index that cannot be built here
+    is logged and left to the workers.
+    """
+    for name, build in (
+        ("suggestion", suggestion_engine.refresh),
+        ("event search", event_search.reload),
+        ("event calendar", event_calendar.reload),
+    ):
+        try:
+            build()
+        except Exception:
+            logging.exception("Could not preload the %s index", name)
+
+
+def serve():
+    startup = Startup()
+    if server_mode not in ("thread", "aio"):
+        raise ValueError("Unknown GRPC_SERVER_MODE: " + server_mode)
+    if not port:
+        raise ValueError("GRPC_PORT is not set")
+    if processes < 1:
+        raise ValueError("GRPC_PROCESSES must be at least 1")
+    startup.finish("config")
+
+    if processes == 1:
+        runServer(startup)
+        return
+
+    # Done once here; the engine is dropped again before forking so that
+    # every worker opens its own connections.
+    initEngine()
+    prepareSchema()
+    startup.finish("schema")
+    preloadIndexes()
+    disposeEngine()
+    startup.finish("indexes")
+    # Keeps the collector in the workers from writing to, and so copying,
+    # the pages of the inherited indexes.
+    gc.freeze()
+    superviseWorkers(processes, runWorker)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(process)d %(levelname)s %(name)s: %(message)s"
+    )
+    serve()
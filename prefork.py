@@ -0,0 +1,150 @@
+"""Runs the server in several forked worker processes sharing one port.
+
+Each worker binds the gRPC port with ``SO_REUSEPORT`` and the kernel spreads
+incoming connections across them, so CPU-bound handlers are no longer
+limited to the one core the GIL allows a process. The parent opens no
+database connection and creates no gRPC objects that outlive the fork, so
+every worker builds its own engine, pool and server; it only hands down the
+in-memory indexes it built before forking.
+
+Once its server is up, a worker Pings it every ``WORKER_HEARTBEAT_SECONDS``
+through a private localhost port, waiting up to ``WORKER_PING_TIMEOUT``, and
+reports a heartbeat when the server answered (or shed the call with
+RESOURCE_EXHAUSTED, which still means it is handling calls). A worker that
+exits, or whose heartbeat is older than ``WORKER_HEARTBEAT_TIMEOUT``, is
+killed and replaced. A worker that did not stay up for
+``WORKER_STABLE_SECONDS`` is restarted after ``WORKER_RESTART_DELAY``
+seconds, doubling with every further early exit up to
+``WORKER_RESTART_MAX_DELAY``. On SIGTERM or SIGINT the parent forwards
+SIGTERM, which makes each worker drain its in-flight calls for up to
+``GRPC_SHUTDOWN_GRACE`` seconds, and kills the workers still running a few
+seconds after that.
+"""
+
+import logging
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import signal
+import time
+
+from background import startPeriodic
+
+heartbeat_interval = float(os.environ.get("WORKER_HEARTBEAT_SECONDS", "1"))
+heartbeat_timeout = float(os.environ.get("WORKER_HEARTBEAT_TIMEOUT", "30"))
+ping_timeout = float(os.environ.get("WORKER_PING_TIMEOUT", "5"))
+restart_delay = float(os.environ.get("WORKER_RESTART_DELAY", "1"))
+restart_max_delay = float(os.environ.get("WORKER_RESTART_MAX_DELAY", "60"))
+stable_seconds = float(os.environ.get("WORKER_STABLE_SECONDS", "60"))
+shutdown_grace = float(os.environ.get("GRPC_SHUTDOWN_GRACE", "10"))
+
+_context = multiprocessing.get_context("fork")
+
+
+class Worker:
+    def __init__(self, index, target):
+        self.index = index
+        self.heartbeat = _context.Value("d", time.monotonic(), lock=False)
+        self.started_at = time.monotonic()
+        self.process = _context.Process(
+            target=runWorker,
+            args=(target, index, self.heartbeat),
+            name="participant-worker-%d" % index,
+        )
+        self.process.start()
+
+    def isStale(self, now):
+        return now - self.heartbeat.value > heartbeat_timeout
+
+
+def runWorker(target, index, heartbeat):
+    # The parent's handlers only set flags for its supervision loop.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    def serving(ping):
+        """Starts the heartbeat; ``ping(timeout)`` raises unless the server answers."""
+
+        def beat():
+            try:
+                ping(ping_timeout)
+            except Exception as error:
+                logging.warning("Worker %d did not answer its ping: %s", index, error)
+                return
+            heartbeat.value = time.monotonic()
+
+        startPeriodic(beat, heartbeat_interval, "worker-heartbeat", first_delay=0)
+
+    target(index, serving)
+
+
+def superviseWorkers(count, target):
+    """Runs ``target(index, serving)`` in ``count`` forked workers until SIGTERM or SIGINT.
+
+    ``target`` calls ``serving(ping)`` once its server is up; see runWorker.
+    """
+    stopping = []
+    previous_handlers = {
+        signum: signal.signal(signum, lambda signum, frame: stopping.append(signum))
+        for signum in (signal.SIGTERM, signal.SIGINT)
+    }
+
+    workers = [Worker(index, target) for index in range(count)]
+    restart_at = {}
+    # Early exits in a row per worker slot, for the restart backoff.
+    failures = [0] * count
+    try:
+        while not stopping:
+            wait(
+                [worker.process.sentinel for worker in workers if worker],
+                timeout=heartbeat_interval,
+            )
+            now = time.monotonic()
+            for index, worker in enumerate(workers):
+                if worker is None:
+                    if now >= restart_at[index]:
+                        del restart_at[index]
+                        workers[index] = Worker(index, target)
+                    continue
+                if worker.process.is_alive() and not worker.isStale(now):
+                    continue
+
+                if worker.process.is_alive():
+                    logging.error("Worker %d stopped responding; killing it", index)
+                    worker.process.kill()
+                    worker.process.join()
+                else:
+                    logging.error(
+                        "Worker %d exited with code %s", index, worker.process.exitcode
+                    )
+                workers[index] = None
+                if now - worker.started_at < stable_seconds:
+                    failures[index] += 1
+                    delay = min(
+                        restart_delay * 2 ** (failures[index] - 1), restart_max_delay
+                    )
+                    logging.info("Restarting worker %d in %.0fs", index, delay)
+                else:
+                    failures[index] = 0
+                    delay = 0
+                restart_at[index] = now + delay
+    finally:
+        stopWorkers([worker for worker in workers if worker])
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+
+
+def stopWorkers(workers):
+    for worker in workers:
+        if worker.process.is_alive():
+            worker.process.terminate()
+
+    # Workers drain for GRPC_SHUTDOWN_GRACE themselves; the margin lets them
+    # close their pools before they are killed.
+    deadline = time.monotonic() + shutdown_grace + 5
+    for worker in workers:
+        worker.process.join(max(deadline - time.monotonic(), 0))
+        if worker.process.is_alive():
+            logging.warning("Worker %d did not stop in time; killing it", worker.index)
+            worker.process.kill()
+            worker.process.join()
@@ -0,0 +1,55 @@
+"""Writes cProfile and SQL timing dumps of individual RPCs.
+
+Profiling is off unless ``PROFILE_DIR`` is set. Then a call is profiled when
+it carries ``profile: true`` metadata, or at random with probability
+``PROFILE_SAMPLE_RATE``. Each profiled call leaves ``<stem>.prof`` (load it
+with ``pstats``) and ``<stem>.sql.txt`` in ``PROFILE_DIR``; only the newest
+``PROFILE_MAX_FILES`` calls are kept.
+"""
+
+import glob
+import itertools
+import logging
+import os
+import random
+import time
+
+profile_dir = os.environ.get("PROFILE_DIR")
+profile_sample_rate = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+profile_max_files = int(os.environ.get("PROFILE_MAX_FILES", "100"))
+
+_sequence = itertools.count()
+
+
+def shouldProfile(metadata):
+    if not profile_dir:
+        return False
+    for key, value in metadata or ():
+        if key == "profile" and value.lower() in ("1", "true"):
+            return True
+    return random.random() < profile_sample_rate
+
+
+def writeProfile(method, profile, statements):
+    """Dumps one call's profile and ``(seconds, rows, statement)`` list, then rotates."""
+    try:
+        os.makedirs(profile_dir, exist_ok=True)
+        stem = os.path.join(
+            profile_dir,
+            "%s-%d-%06d-%s"
+            % (time.strftime("%Y%m%dT%H%M%S"), os.getpid(), next(_sequence), method),
+        )
+        profile.dump_stats(stem + ".prof")
+        with open(stem + ".sql.txt", "w") as file:
+            for seconds, rows, statement in statements:
+                rows = ", %d rows" % rows if rows >= 0 else ""
+                file.write("-- %.3f ms%s\n%s;\n\n" % (seconds * 1000, rows, statement))
+
+        profiles = sorted(glob.glob(os.path.join(profile_dir, "*.prof")))
+        for old_profile in profiles[: max(len(profiles) - profile_max_files, 0)]:
+            old_stem = old_profile[: -len(".prof")]
+            for path in (old_profile, old_stem + ".sql.txt"):
+                if os.path.exists(path):
+                    os.remove(path)
+    except Exception:
+        logging.exception("Could not write profile of %s", method)
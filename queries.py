@@ -0,0 +1,83 @@
+"""Baked queries for the hot single-table lookups.
+
+A plain ``session.query(...).filter(...)`` chain is rebuilt and its SQL
+compiled on every call. A baked query is built once; its Query and compiled
+SQL are cached in ``bakery`` and every call only binds the parameters:
+
+    tag_by_id(session).params(id=tag_id).scalar()
+
+Each lambda's code object is part of the cache key, so every query is
+defined once, here, and takes its values through ``bindparam``.
+"""
+
+import os
+
+from sqlalchemy import bindparam
+from sqlalchemy.ext import baked
+
+from db_model import (
+    Answer,
+    EventDuration,
+    EventTag,
+    Location,
+    Question,
+    QuestionGroup,
+    Tag,
+    UserEvent,
+)
+
+bakery = baked.bakery(size=int(os.environ.get("BAKED_QUERY_CACHE_SIZE", "200")))
+
+tag_by_id = bakery(lambda session: session.query(Tag).filter(Tag.id == bindparam("id")))
+location_by_id = bakery(
+    lambda session: session.query(Location).filter(Location.id == bindparam("id"))
+)
+question_by_id = bakery(
+    lambda session: session.query(Question).filter(Question.id == bindparam("id"))
+)
+tags_by_event_id = bakery(
+    lambda session: session.query(Tag)
+    .join(EventTag, EventTag.tag_id == Tag.id)
+    .filter(EventTag.event_id == bindparam("event_id"))
+)
+ratings_by_event_id = bakery(
+    lambda session: session.query(UserEvent.rating).filter(
+        UserEvent.event_id == bindparam("event_id")
+    )
+)
+durations_by_event_id = bakery(
+    lambda session: session.query(EventDuration).filter(
+        EventDuration.event_id == bindparam("event_id")
+    )
+)
+question_groups_by_event_id = bakery(
+    lambda session: session.query(QuestionGroup).filter(
+        QuestionGroup.event_id == bindparam("event_id")
+    )
+)
+questions_by_question_group_id = bakery(
+    lambda session: session.query(Question).filter(
+        Question.question_group_id == bindparam("question_group_id")
+    )
+)
+answers_by_user_event_id = bakery(
+    lambda session: session.query(Answer).filter(
+        Answer.user_event_id == bindparam("user_event_id")
+    )
+)
+user_answer_by_question_id = bakery(
+    lambda session: session.query(Answer)
+    .join(UserEvent, Answer.user_event_id == UserEvent.id)
+    .filter(
+        Answer.question_id == bindparam("question_id"),
+        UserEvent.user_id == bindparam("user_id"),
+        UserEvent.is_internal == False,
+    )
+)
+user_event_by_user_and_event_id = bakery(
+    lambda session: session.query(UserEvent).filter(
+        UserEvent.user_id == bindparam("user_id"),
+        UserEvent.event_id == bindparam("event_id"),
+        UserEvent.is_internal == False,
+    )
+)
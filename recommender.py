@@ -0,0 +1,163 @@
+"""In-memory event suggestions built from EventTag and UserEvent history.
+
+Each user gets a tag affinity: how many of the events they joined carry each
+tag. Suggestions are the most popular events under the user's strongest
+tags that they have not joined yet, topped up with the globally most popular
+events. Everything is answered from memory; the database is only read by
+``SuggestionEngine.refresh``, which rebuilds the whole index, so new joins,
+cancellations and retagged events all show up after the next refresh.
+"""
+
+from collections import Counter, defaultdict
+import bisect
+import heapq
+import itertools
+import os
+import random
+import threading
+
+from background import startRefreshing
+from db_model import EventTag, UserEvent
+from replicas import ReadSession
+
+refresh_interval = float(os.environ.get("SUGGESTION_REFRESH_SECONDS", "300"))
+top_tags_per_user = int(os.environ.get("SUGGESTION_TOP_TAGS", "5"))
+events_per_tag = int(os.environ.get("SUGGESTION_EVENTS_PER_TAG", "50"))
+
+
+class SuggestionIndex:
+    """Read-only index built from ``(event_id, tag_id)`` and ``(user_id, event_id)`` pairs."""
+
+    def __init__(self, event_tags=(), user_events=()):
+        self.event_tags = defaultdict(set)
+        self.tag_events = defaultdict(set)
+        self.user_events = defaultdict(set)
+        self.user_tags = defaultdict(Counter)
+        self.popularity = Counter()
+
+        for event_id, tag_id in event_tags:
+            self.event_tags[event_id].add(tag_id)
+            self.tag_events[tag_id].add(event_id)
+        for user_id, event_id in user_events:
+            if event_id in self.user_events[user_id]:
+                continue
+            self.user_events[user_id].add(event_id)
+            self.popularity[event_id] += 1
+            self.user_tags[user_id].update(self.event_tags.get(event_id, ()))
+
+        # Tuples, so that sampling a tag's events does not copy them first.
+        self.tag_samples = {
+            tag_id: tuple(events) for tag_id, events in self.tag_events.items()
+        }
+
+        popularity = self.popularity
+        self.tag_ranking = {
+            tag_id: heapq.nlargest(events_per_tag, events, key=popularity.__getitem__)
+            for tag_id, events in self.tag_events.items()
+        }
+        self.popular = [
+            event_id for event_id, count in popularity.most_common(events_per_tag)
+        ]
+
+    def sampleTagged(self, tags_id, n):
+        """Returns up to ``n`` random distinct events carrying any of ``tags_id``.
+
+        Positions are drawn across the tags' event tuples instead of building
+        their union. A drawn event is kept only under the first requested tag
+        that carries it, so events with several of the tags are not favoured.
+        When ``n`` is close to the number of events, or the draws keep
+        hitting kept ones, the union is sampled instead.
+        """
+        tags = [
+            tag_id for tag_id in dict.fromkeys(tags_id) if tag_id in self.tag_samples
+        ]
+        if n <= 0 or not tags:
+            return []
+        if len(tags) == 1:
+            events = self.tag_samples[tags[0]]
+            return random.sample(events, min(n, len(events)))
+
+        ends = list(itertools.accumulate(len(self.tag_samples[tag]) for tag in tags))
+        if 2 * n <= ends[-1]:
+            sampled = {}
+            for _ in range(4 * n):
+                position = random.randrange(ends[-1])
+                tag = bisect.bisect_right(ends, position)
+                event_id = self.tag_samples[tags[tag]][
+                    position - (ends[tag - 1] if tag else 0)
+                ]
+                if event_id not in sampled and not any(
+                    event_id in self.tag_events[tag_id] for tag_id in tags[:tag]
+                ):
+                    sampled[event_id] = None
+                    if len(sampled) == n:
+                        return list(sampled)
+
+        events = list(set().union(*(self.tag_samples[tag] for tag in tags)))
+        return random.sample(events, min(n, len(events)))
+
+    def suggest(self, user_id, n):
+        joined = self.user_events.get(user_id, ())
+        affinity = self.user_tags.get(user_id, Counter())
+        scores = Counter()
+        for tag_id, weight in affinity.most_common(top_tags_per_user):
+            for rank, event_id in enumerate(self.tag_ranking.get(tag_id, ())):
+                if event_id not in joined:
+                    scores[event_id] += weight / (rank + 1)
+
+        suggested = [event_id for event_id, score in scores.most_common(n)]
+        for event_id in self.popular:
+            if len(suggested) >= n:
+                break
+            if event_id not in joined and event_id not in scores:
+                suggested.append(event_id)
+        return suggested
+
+
+class SuggestionEngine:
+    """Keeps a SuggestionIndex current by rebuilding it from the database."""
+
+    def __init__(self):
+        self.index = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            session = ReadSession()
+            try:
+                event_tags = session.query(EventTag.event_id, EventTag.tag_id).all()
+                user_events = (
+                    session.query(UserEvent.user_id, UserEvent.event_id)
+                    .filter(UserEvent.is_internal == False)
+                    .all()
+                )
+            finally:
+                session.close()
+
+            self.index = SuggestionIndex(event_tags, user_events)
+
+    def start(self):
+        """Builds the index in the background, then keeps rebuilding it."""
+        return startRefreshing(
+            self.refresh,
+            refresh_interval,
+            "suggestion-refresh",
+            loaded=self.index is not None,
+        )
+
+    def sampleTagged(self, tags_id, n):
+        """Like SuggestionIndex.sampleTagged; None until the index has been built."""
+        index = self.index
+        if index is None:
+            return None
+        return index.sampleTagged(tags_id, n)
+
+    def suggest(self, user_id, n):
+        """Returns up to ``n`` event ids; none until the index has been built."""
+        index = self.index
+        if index is None:
+            return []
+        return index.suggest(user_id, n)
+
+
+suggestion_engine = SuggestionEngine()
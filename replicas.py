@@ -0,0 +1,177 @@
+"""Routes read-only sessions to PostgreSQL read replicas.
+
+Replicas come from ``DATABASE_REPLICA_URLS`` (comma separated URLs) or
+``POSTGRES_REPLICA_HOSTS`` (hosts sharing the primary's credentials and
+database). Each replica is checked every ``REPLICA_CHECK_SECONDS`` on a
+thread of its own, so a replica that hangs does not delay the others. The
+check fails when the query fails, when a standby's WAL receiver is not
+streaming, or when it lags more than ``REPLICA_MAX_LAG_SECONDS``. A replica
+gets new sessions only while its last check passed within
+``REPLICA_STALE_SECONDS``.
+
+``ReadSession`` hands out sessions round-robin over the healthy replicas and
+falls back to the primary when there are none, before ``start`` or before
+the first checks have passed, and when the chosen replica cannot be
+connected to (which also marks it unhealthy until its next check). It is
+for work that tolerates that lag: writes, and reads that must see the
+caller's own writes, stay on ``DBSession``.
+"""
+
+import itertools
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import metrics
+from background import startPeriodic
+from db_model import DBSession, createEngine, db, password, user
+
+replica_database_urls = os.environ.get("DATABASE_REPLICA_URLS", "")
+replica_hosts = os.environ.get("POSTGRES_REPLICA_HOSTS", "")
+check_interval = float(os.environ.get("REPLICA_CHECK_SECONDS", "5"))
+stale_after = float(os.environ.get("REPLICA_STALE_SECONDS", str(check_interval * 3)))
+max_lag = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", "10"))
+connect_timeout = int(os.environ.get("REPLICA_CONNECT_TIMEOUT", "2"))
+
+# On a standby, ``receiving`` is false once its WAL receiver stops streaming:
+# its lag then stays at zero while it falls behind. Unprivileged roles see
+# the receiver's row but not its status, hence the NULL. ``lag`` is zero
+# when everything received has been replayed, so an idle primary does not
+# look like lag.
+LAG_QUERY = text(
+    "SELECT pg_is_in_recovery() AS standby, "
+    "EXISTS (SELECT 1 FROM pg_stat_wal_receiver "
+    "WHERE status IS NULL OR status = 'streaming') AS receiving, "
+    "CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+    "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) "
+    "END AS lag"
+)
+
+read_sessions = metrics.Counter(
+    "db_read_sessions_total", "Read-only sessions, by database used.", ["target"]
+)
+
+
+def replicaUrls():
+    if replica_database_urls:
+        return [url for url in replica_database_urls.split(",") if url]
+    hosts = [replica_host for replica_host in replica_hosts.split(",") if replica_host]
+    if hosts and not (user and password and db):
+        raise ValueError(
+            "POSTGRES_REPLICA_HOSTS needs POSTGRES_USER, POSTGRES_PASSWORD and "
+            "POSTGRES_DB; use DATABASE_REPLICA_URLS otherwise"
+        )
+    return [
+        "postgresql://" + user + ":" + password + "@" + replica_host + "/" + db
+        for replica_host in hosts
+    ]
+
+
+class Replica:
+    def __init__(self, url):
+        self.engine = createEngine(url, connect_timeout=connect_timeout, pre_ping=True)
+        self.name = repr(self.engine.url)  # without the password
+        self.healthy = None
+        self.checked_at = None
+
+    def isHealthy(self, now):
+        return bool(self.healthy) and now - self.checked_at <= stale_after
+
+    def check(self):
+        problem = None
+        try:
+            with self.engine.connect() as connection:
+                if connection.dialect.name == "postgresql":
+                    row = connection.execute(LAG_QUERY).first()
+                    if row.standby and not row.receiving:
+                        problem = "is not receiving WAL"
+                    elif row.lag is not None and row.lag > max_lag:
+                        problem = "lags %.1fs" % row.lag
+                else:
+                    connection.execute(text("SELECT 1"))
+        except Exception as error:
+            problem = "failed its health check: %s" % error
+        self.report(problem)
+
+    def report(self, problem):
+        if problem and self.healthy is not False:
+            logging.warning("Replica %s %s", self.name, problem)
+        elif not problem and not self.healthy:
+            logging.info("Replica %s is healthy", self.name)
+        self.healthy = problem is None
+        self.checked_at = time.monotonic()
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.replicas = []
+        self._next = itertools.count()
+        self._stopped = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Creates the replica engines and starts checking them in the background.
+
+        Raises ValueError when the replicas are misconfigured. Until a
+        replica's first check passes, its reads go to the primary.
+        """
+        with self._lock:
+            if self.replicas:
+                return
+            self.replicas = [Replica(url) for url in replicaUrls()]
+            self._stopped = [
+                startPeriodic(
+                    replica.check,
+                    check_interval,
+                    "replica-check-%d" % index,
+                    first_delay=0,
+                )
+                for index, replica in enumerate(self.replicas)
+            ]
+
+    def stop(self):
+        with self._lock:
+            replicas, self.replicas = self.replicas, []
+            stopped, self._stopped = self._stopped, []
+        for event in stopped:
+            event.set()
+        for replica in replicas:
+            replica.engine.dispose()
+
+    def session(self):
+        now = time.monotonic()
+        healthy = [replica for replica in self.replicas if replica.isHealthy(now)]
+        if healthy:
+            replica = healthy[next(self._next) % len(healthy)]
+            session = DBSession(bind=replica.engine)
+            try:
+                # Connects now, so that a replica gone since its last check
+                # costs this call a retry on the primary rather than an error.
+                session.connection()
+            except OperationalError as error:
+                session.close()
+                replica.report("failed to connect: %s" % error)
+            else:
+                read_sessions.inc(1, "replica")
+                return session
+        read_sessions.inc(1, "primary")
+        return DBSession()
+
+
+read_replicas = ReplicaRouter()
+
+metrics.Gauge(
+    "db_replicas_healthy",
+    "Read replicas currently receiving sessions.",
+    lambda: sum(
+        replica.isHealthy(time.monotonic()) for replica in read_replicas.replicas
+    ),
+)
+
+
+def ReadSession():
+    return read_replicas.session()
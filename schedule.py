@@ -0,0 +1,158 @@
+"""In-memory calendar of event durations for the date-range RPCs.
+
+Durations are kept sorted by start, so events starting in a range are one
+bisect away. For overlap queries they are also bucketed by length, powers of
+two apart: within a bucket the range only has to be widened by that
+bucket's longest duration, so one long event does not make every query scan
+back over all the short ones. Results are event ids ordered by their first
+matching start, each listed once. The calendar is reloaded every
+``EVENT_CALENDAR_REFRESH_SECONDS`` (see ``background.startRefreshing``) and,
+through ``search.event_search``'s NOTIFY listener, the durations of the
+notified events are reread as they change.
+"""
+
+import bisect
+import heapq
+from datetime import timedelta
+import os
+import threading
+
+from background import startRefreshing
+from db_model import DBSession, EventDuration
+from replicas import ReadSession
+from search import event_search
+
+refresh_interval = float(os.environ.get("EVENT_CALENDAR_REFRESH_SECONDS", "300"))
+
+
+class DurationBucket:
+    """Durations of similar length, sorted by start."""
+
+    def __init__(self, durations):
+        self.durations = durations
+        self.starts = [start for start, _, _ in durations]
+        self.max_duration = max(
+            max(finish - start for start, finish, _ in durations), timedelta(0)
+        )
+
+    def overlapping(self, start, end):
+        low = bisect.bisect_left(self.starts, start - self.max_duration)
+        high = bisect.bisect_left(self.starts, end)
+        return (
+            duration
+            for duration in self.durations[low:high]
+            if duration[0] >= start or duration[1] > start
+        )
+
+
+class CalendarIndex:
+    def __init__(self, durations):
+        """Indexes ``(event_id, start, finish)`` rows; rows without a start are skipped."""
+        self.durations = sorted(
+            (start, finish or start, event_id)
+            for event_id, start, finish in durations
+            if start is not None
+        )
+        self.starts = [start for start, _, _ in self.durations]
+
+        buckets = {}
+        for duration in self.durations:
+            seconds = max(int((duration[1] - duration[0]) / timedelta(seconds=1)), 0)
+            buckets.setdefault(seconds.bit_length(), []).append(duration)
+        self.buckets = [DurationBucket(durations) for durations in buckets.values()]
+
+    def startingBetween(self, start, end):
+        """Returns the events with a duration starting in ``[start, end)``."""
+        low = bisect.bisect_left(self.starts, start)
+        high = bisect.bisect_left(self.starts, end)
+        return list(
+            dict.fromkeys(event_id for _, _, event_id in self.durations[low:high])
+        )
+
+    def overlapping(self, start, end):
+        """Returns the events with a duration overlapping ``[start, end)``."""
+        return list(
+            dict.fromkeys(
+                event_id
+                for _, _, event_id in heapq.merge(
+                    *(bucket.overlapping(start, end) for bucket in self.buckets)
+                )
+            )
+        )
+
+
+class CalendarEngine:
+    def __init__(self):
+        self.index = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        session = ReadSession()
+        try:
+            rows = session.query(
+                EventDuration.event_id, EventDuration.start, EventDuration.finish
+            ).all()
+        finally:
+            session.close()
+
+        self.index = CalendarIndex(rows)
+
+    def reload(self):
+        with self._lock:
+            self.load()
+
+    def refreshEvents(self, events_id):
+        """Rereads the durations of ``events_id`` and swaps in a calendar with them.
+
+        The rest of the calendar is rebuilt from memory. The rows come from
+        the primary, which a notification may reach before the replicas.
+        """
+        with self._lock:
+            if self.index is None:
+                return
+            session = DBSession()
+            try:
+                rows = (
+                    session.query(
+                        EventDuration.event_id,
+                        EventDuration.start,
+                        EventDuration.finish,
+                    )
+                    .filter(EventDuration.event_id.in_(events_id))
+                    .all()
+                )
+            finally:
+                session.close()
+
+            changed = set(events_id)
+            kept = [
+                (event_id, start, finish)
+                for start, finish, event_id in self.index.durations
+                if event_id not in changed
+            ]
+            self.index = CalendarIndex(kept + rows)
+
+    def start(self):
+        """Builds the calendar in the background, then keeps reloading it."""
+        return startRefreshing(
+            self.reload,
+            refresh_interval,
+            "event-calendar-refresh",
+            loaded=self.index is not None,
+        )
+
+    def getIndex(self):
+        """Returns the calendar, building it first if the background build has not yet.
+
+        Callers arriving during a build wait for it instead of each loading
+        the table again.
+        """
+        if self.index is None:
+            with self._lock:
+                if self.index is None:
+                    self.load()
+        return self.index
+
+
+event_calendar = CalendarEngine()
+event_search.subscribe(event_calendar)
@@ -0,0 +1,261 @@
+"""In-memory search over event names and descriptions for paged GetEventsByStringOfName.
+
+Results come in tiers: names starting with the text, then names with a word
+starting with it (both alphabetical, from sorted lists), then other names
+containing it (from a trigram index) and finally descriptions with a word
+starting with it (from a sorted list). Every tier stops as soon as ``limit``
+results are found, so typeahead stays cheap however many events match.
+
+The index is rebuilt every ``EVENT_SEARCH_REFRESH_SECONDS`` and, when
+``EVENT_SEARCH_CHANNEL`` is set, updated from Postgres NOTIFY messages whose
+payload is the changed event id. Notifications arrive on a connection of
+their own, outside the pool, which is reopened after errors. Other indexes
+of events can ``subscribe`` to the same notifications.
+"""
+
+from collections import defaultdict
+import bisect
+import logging
+import os
+import select
+import threading
+
+from background import startRefreshing
+from db_model import DBSession, Event, initEngine
+from helper import invalidateEvents
+
+refresh_interval = float(os.environ.get("EVENT_SEARCH_REFRESH_SECONDS", "600"))
+notify_channel = os.environ.get("EVENT_SEARCH_CHANNEL")
+listen_retry_seconds = float(os.environ.get("EVENT_SEARCH_LISTEN_RETRY_SECONDS", "1"))
+
+
+def trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def prefixMatches(entries, text):
+    """Yields ids from sorted ``(key, id)`` entries whose key starts with ``text``."""
+    for index in range(bisect.bisect_left(entries, (text,)), len(entries)):
+        key, event_id = entries[index]
+        if not key.startswith(text):
+            return
+        yield event_id
+
+
+def candidates(postings, text):
+    grams = sorted((postings.get(gram, ()) for gram in trigrams(text)), key=len)
+    return set(grams[0]).intersection(*grams[1:])
+
+
+class EventSearchIndex:
+    def __init__(self):
+        self.documents = {}
+        self.name_postings = defaultdict(set)
+        self.names = []
+        self.words = []
+        self.description_words = []
+        self._lock = threading.Lock()
+
+    def upsert(self, rows):
+        """Indexes ``(id, name, description)`` rows, replacing earlier versions."""
+        with self._lock:
+            for event_id, name, description in rows:
+                self._remove(event_id)
+                name = (name or "").lower()
+                description = (description or "").lower()
+                self.documents[event_id] = (name, description)
+                for gram in trigrams(name):
+                    self.name_postings[gram].add(event_id)
+                self.names.append((name, event_id))
+                self.words.extend((word, event_id) for word in set(name.split()))
+                self.description_words.extend(
+                    (word, event_id) for word in set(description.split())
+                )
+            # Appended entries form one unsorted run, which timsort merges cheaply.
+            self.names.sort()
+            self.words.sort()
+            self.description_words.sort()
+
+    def remove(self, events_id):
+        with self._lock:
+            for event_id in events_id:
+                self._remove(event_id)
+
+    def _remove(self, event_id):
+        document = self.documents.pop(event_id, None)
+        if document is None:
+            return
+        name, description = document
+        for gram in trigrams(name):
+            self.name_postings[gram].discard(event_id)
+        del self.names[bisect.bisect_left(self.names, (name, event_id))]
+        for word in set(name.split()):
+            del self.words[bisect.bisect_left(self.words, (word, event_id))]
+        for word in set(description.split()):
+            del self.description_words[
+                bisect.bisect_left(self.description_words, (word, event_id))
+            ]
+
+    def search(self, text, limit):
+        """Returns up to ``limit`` event ids matching ``text``, best match first."""
+        text = text.lower()
+        matches = []
+        seen = set()
+
+        def add(event_ids):
+            for event_id in event_ids:
+                if event_id not in seen:
+                    seen.add(event_id)
+                    matches.append(event_id)
+                    if len(matches) == limit:
+                        return True
+            return False
+
+        with self._lock:
+            if add(prefixMatches(self.names, text)) or add(
+                prefixMatches(self.words, text)
+            ):
+                return matches
+            if len(text) >= 3 and add(
+                event_id
+                for event_id in candidates(self.name_postings, text)
+                if text in self.documents[event_id][0]
+            ):
+                return matches
+            add(prefixMatches(self.description_words, text))
+            return matches
+
+
+class EventSearchEngine:
+    def __init__(self):
+        self.index = None
+        # Serializes full loads with each other and with NOTIFY updates, so
+        # an update is never overwritten by a load that read the rows before it.
+        self._lock = threading.Lock()
+        self.subscribers = []
+
+    def subscribe(self, engine):
+        """Passes notified event ids on to ``engine.refreshEvents`` as well.
+
+        ``engine.reload`` is called after the listener reconnects, like this
+        index's own.
+        """
+        self.subscribers.append(engine)
+
+    def load(self):
+        session = DBSession()
+        try:
+            rows = session.query(Event.id, Event.name, Event.description).all()
+        finally:
+            session.close()
+
+        index = EventSearchIndex()
+        index.upsert(rows)
+        self.index = index
+
+    def reload(self):
+        with self._lock:
+            self.load()
+
+    def refreshEvents(self, events_id):
+        with self._lock:
+            if self.index is not None:
+                session = DBSession()
+                try:
+                    rows = (
+                        session.query(Event.id, Event.name, Event.description)
+                        .filter(Event.id.in_(events_id))
+                        .all()
+                    )
+                finally:
+                    session.close()
+
+                found = {row.id for row in rows}
+                self.index.upsert(rows)
+                self.index.remove(
+                    [event_id for event_id in events_id if event_id not in found]
+                )
+        invalidateEvents(*events_id)
+
+    def listen(self, stopped):
+        """Applies NOTIFY messages until ``stopped`` is set, reconnecting with backoff.
+
+        Notifications sent while disconnected are lost, so the index is
+        reloaded after every reconnect.
+        """
+        engine = initEngine()
+        if engine.dialect.driver != "psycopg2":
+            logging.warning(
+                "EVENT_SEARCH_CHANNEL needs PostgreSQL with psycopg2; not listening"
+            )
+            return
+
+        delay = listen_retry_seconds
+        reconnect = False
+        while not stopped.is_set():
+            connection = None
+            try:
+                cargs, cparams = engine.dialect.create_connect_args(engine.url)
+                connection = engine.dialect.connect(*cargs, **cparams)
+                connection.autocommit = True
+                connection.cursor().execute("LISTEN " + notify_channel)
+                logging.info("Listening for event changes on %s", notify_channel)
+                if reconnect:
+                    for engine in [self] + self.subscribers:
+                        engine.reload()
+                delay = listen_retry_seconds
+                while not stopped.is_set():
+                    # Wakes up every second to notice ``stopped``.
+                    if select.select([connection], [], [], 1)[0]:
+                        connection.poll()
+                        events_id = set()
+                        while connection.notifies:
+                            events_id.add(int(connection.notifies.pop(0).payload))
+                        if events_id:
+                            for engine in [self] + self.subscribers:
+                                engine.refreshEvents(list(events_id))
+            except Exception:
+                logging.exception(
+                    "Event search listener failed; reconnecting in %.0fs", delay
+                )
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            reconnect = True
+            stopped.wait(delay)
+            delay = min(delay * 2, refresh_interval)
+
+    def start(self):
+        """Builds the index in the background, then keeps it current."""
+        stopped = startRefreshing(
+            self.reload,
+            refresh_interval,
+            "event-search-refresh",
+            loaded=self.index is not None,
+        )
+        if notify_channel:
+            threading.Thread(
+                target=self.listen,
+                args=(stopped,),
+                name="event-search-listener",
+                daemon=True,
+            ).start()
+        return stopped
+
+    def search(self, text, limit):
+        """Searches the index, building it first if the background build has not yet.
+
+        Callers arriving during a build wait for it instead of each loading
+        the table again.
+        """
+        if self.index is None:
+            with self._lock:
+                if self.index is None:
+                    self.load()
+        return self.index.search(text, limit)
+
+
+event_search = EventSearchEngine()
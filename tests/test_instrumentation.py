@@ -0,0 +1,18 @@
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+import instrumentation
+
+
+def test_failed_statements_do_not_leak_their_start_time():
+    assert event.contains(Engine, "handle_error", instrumentation.failQuery)
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.execute(text("SELECT * FROM missing"))
+        connection.execute(text("SELECT 1"))
+
+        assert connection.connection.info["query_started_at"] == []
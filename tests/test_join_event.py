@@ -0,0 +1,143 @@
+"""Concurrent joins against PostgreSQL, where the per-event advisory lock matters.
+
+Set ``TEST_POSTGRES_URL`` to an empty, throwaway database to run these; its
+tables are dropped and recreated. SQLite serializes writers on its own, so
+the tests are skipped without it.
+"""
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import os
+import random
+
+import grpc
+import pytest
+from sqlalchemy import func
+
+import db_model
+from benchmarks.calls import Context
+from benchmarks.seed import insert, seed
+from db_model import Base, DBSession, Event, UserEvent, disposeEngine, initEngine
+from extensions import requestType
+from main import ParticipantService
+
+USERS = 200
+THREADS = 16
+
+postgres_url = os.environ.get("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not postgres_url, reason="TEST_POSTGRES_URL is not set")
+
+
+@pytest.fixture(scope="module", autouse=True)
+def database():
+    database_url = db_model.database_url
+    disposeEngine()
+    db_model.database_url = postgres_url
+    Base.metadata.drop_all(initEngine())
+    seed(users=USERS)
+    yield
+    Base.metadata.drop_all(initEngine())
+    disposeEngine()
+    db_model.database_url = database_url
+
+
+def createEvent(attendee_limit):
+    session = DBSession()
+    try:
+        event_id = session.query(func.max(Event.id)).scalar() + 1
+    finally:
+        session.close()
+    with initEngine().begin() as connection:
+        insert(
+            connection,
+            Event,
+            [
+                {
+                    "id": event_id,
+                    "organization_id": 1,
+                    "location_id": 1,
+                    "name": "Popular",
+                    "attendee_limit": attendee_limit,
+                }
+            ],
+        )
+    return event_id
+
+
+def attendees(event_id):
+    session = DBSession()
+    try:
+        return [
+            user_id
+            for (user_id,) in session.query(UserEvent.user_id).filter(
+                UserEvent.event_id == event_id
+            )
+        ]
+    finally:
+        session.close()
+
+
+def test_concurrent_joins_neither_overbook_nor_duplicate():
+    event_id = createEvent(attendee_limit=50)
+    servicer = ParticipantService()
+    request_type = requestType("JoinEvent")
+    users = list(range(1, USERS + 1)) * 2
+    random.Random(0).shuffle(users)
+
+    def join(user_id):
+        context = Context()
+        try:
+            servicer.JoinEvent(
+                request_type(user_id=user_id, event_id=event_id), context
+            )
+        except Exception:
+            if context.code is None:
+                raise
+        return context.code
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        codes = Counter(executor.map(join, users))
+
+    joined = attendees(event_id)
+    assert len(joined) == 50
+    assert len(set(joined)) == len(joined)
+    assert codes[None] == 50
+    assert set(codes) <= {
+        None,
+        grpc.StatusCode.ALREADY_EXISTS,
+        grpc.StatusCode.FAILED_PRECONDITION,
+    }
+
+
+def test_concurrent_bulk_joins_neither_overbook_nor_duplicate():
+    events_id = [createEvent(attendee_limit=30), createEvent(attendee_limit=40)]
+    servicer = ParticipantService()
+    request_type = requestType("JoinEvent")
+    rng = random.Random(0)
+    batches = []
+    for _ in range(40):
+        # Batches name the events in either order, so lock ordering is exercised.
+        batch = [
+            request_type(user_id=user_id, event_id=event_id)
+            for user_id in rng.sample(range(1, USERS + 1), 10)
+            for event_id in events_id
+        ]
+        rng.shuffle(batch)
+        batches.append(batch)
+
+    def join(batch):
+        return [
+            status.code for status in servicer.BulkJoinEvent(iter(batch), Context())
+        ]
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        codes = Counter(
+            code for batch_codes in executor.map(join, batches) for code in batch_codes
+        )
+
+    for event_id, attendee_limit in zip(events_id, (30, 40)):
+        joined = attendees(event_id)
+        assert len(joined) == attendee_limit
+        assert len(set(joined)) == len(joined)
+    assert codes[grpc.StatusCode.OK.value[0]] == 70
@@ -0,0 +1,9 @@
+from benchmarks.query_counts import growingMethods, runScale
+
+
+def test_query_counts_do_not_grow_with_the_data():
+    results = {scale: runScale(scale) for scale in (1, 4)}
+
+    for scale, result in results.items():
+        assert result["errors"] == {}, "handlers crashed at scale %d" % scale
+    assert growingMethods(results) == []
@@ -0,0 +1,120 @@
+import os
+import shutil
+import time
+
+import pytest
+
+import db_model
+import replicas
+from benchmarks.calls import Context
+from benchmarks.seed import insert, seed
+from db_model import Event, disposeEngine, initEngine
+from extensions import requestType
+from main import ParticipantService
+from replicas import ReadSession, ReplicaRouter
+
+# An event the replica copy has, with no attendees yet.
+EVENT_ID = 1000
+
+
+@pytest.fixture(autouse=True)
+def databases(tmp_path, monkeypatch):
+    """Seeds a primary SQLite file and copies it to ``replica/replica.db``."""
+    primary = tmp_path / "primary.db"
+    replica = tmp_path / "replica" / "replica.db"
+    disposeEngine()
+    monkeypatch.setattr(db_model, "database_url", "sqlite:///%s" % primary)
+    seed()
+    with initEngine().begin() as connection:
+        insert(
+            connection,
+            Event,
+            [{"id": EVENT_ID, "organization_id": 1, "location_id": 1, "name": "New"}],
+        )
+    os.makedirs(replica.parent)
+    shutil.copy(primary, replica)
+
+    router = ReplicaRouter()
+    monkeypatch.setattr(replicas, "read_replicas", router)
+    yield router, "sqlite:///%s" % primary, "sqlite:///%s" % replica
+    router.stop()
+    disposeEngine()
+
+
+def startChecked(router, monkeypatch, *urls):
+    monkeypatch.setattr(replicas, "replica_database_urls", ",".join(urls))
+    router.start()
+    deadline = time.monotonic() + 10
+    while any(replica.checked_at is None for replica in router.replicas):
+        assert time.monotonic() < deadline, "replica checks did not run"
+        time.sleep(0.01)
+
+
+def usedUrl(session):
+    try:
+        return str(session.get_bind().url)
+    finally:
+        session.close()
+
+
+def test_read_sessions_go_to_the_replica(databases, monkeypatch):
+    router, primary, replica = databases
+    startChecked(router, monkeypatch, replica)
+
+    assert [usedUrl(ReadSession()) for _ in range(3)] == [replica] * 3
+
+
+def test_read_sessions_fall_back_to_the_primary(databases, monkeypatch, tmp_path):
+    router, primary, replica = databases
+    assert usedUrl(ReadSession()) == primary
+
+    startChecked(router, monkeypatch, replica)
+    assert usedUrl(ReadSession()) == replica
+
+    # A replica whose last passed check is too old gets no sessions.
+    router.replicas[0].checked_at -= replicas.stale_after + 1
+    assert usedUrl(ReadSession()) == primary
+    router.replicas[0].checked_at = time.monotonic()
+
+    # Neither does one that cannot be connected to since its last check.
+    shutil.rmtree(tmp_path / "replica")
+    router.replicas[0].engine.dispose()
+    assert usedUrl(ReadSession()) == primary
+    assert router.replicas[0].healthy is False
+    assert usedUrl(ReadSession()) == primary
+
+
+def test_unreachable_replica_is_skipped(databases, monkeypatch, tmp_path):
+    router, primary, replica = databases
+    unreachable = "sqlite:///%s" % (tmp_path / "missing" / "replica.db")
+    startChecked(router, monkeypatch, unreachable, replica)
+
+    assert [replica.healthy for replica in router.replicas] == [False, True]
+    assert {usedUrl(ReadSession()) for _ in range(4)} == {replica}
+
+
+def test_replica_hosts_need_the_primary_credentials(databases, monkeypatch):
+    router, primary, replica = databases
+    monkeypatch.setattr(replicas, "replica_hosts", "replica-1")
+    monkeypatch.setattr(replicas, "user", None)
+
+    with pytest.raises(ValueError, match="POSTGRES_REPLICA_HOSTS"):
+        router.start()
+
+
+def test_joined_event_is_read_back_from_the_primary(databases, monkeypatch):
+    router, primary, replica = databases
+    startChecked(router, monkeypatch, replica)
+    servicer = ParticipantService()
+    request = requestType("JoinEvent")(user_id=1, event_id=EVENT_ID)
+
+    joined = servicer.JoinEvent(request, Context())
+    context = Context()
+    user_event = servicer.GetUserEventByUserAndEventId(
+        requestType("GetUserEventByUserAndEventId")(user_id=1, event_id=EVENT_ID),
+        context,
+    )
+
+    assert context.code is None
+    assert user_event.id == joined.id
+    assert usedUrl(ReadSession()) == replica
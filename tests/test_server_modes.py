@@ -0,0 +1,86 @@
+import asyncio
+
+import grpc
+import pytest
+
+import db_model
+import hts.participant.service_pb2_grpc as participant_service_grpc
+from benchmarks.seed import seed
+from db_model import UserEvent, disposeEngine, initEngine
+from extensions import requestType
+from main import createAioServer, createThreadedServer
+
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory):
+    database_url = db_model.database_url
+    disposeEngine()
+    db_model.database_url = "sqlite:///%s" % (
+        tmp_path_factory.mktemp("server_modes") / "participant.db"
+    )
+    seed()
+    yield
+    disposeEngine()
+    db_model.database_url = database_url
+
+
+def threadedStatuses(joined):
+    server = createThreadedServer()
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    try:
+        return errorStatuses(port, joined)
+    finally:
+        server.stop(0).wait()
+
+
+async def aioStatuses(joined):
+    server = createAioServer()
+    port = server.add_insecure_port("localhost:0")
+    await server.start()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, errorStatuses, port, joined
+        )
+    finally:
+        await server.stop(0)
+
+
+def errorStatuses(port, joined):
+    with grpc.insecure_channel("localhost:%d" % port) as channel:
+        stub = participant_service_grpc.ParticipantServiceStub(channel)
+        calls = (
+            (stub.GetEventById, requestType("GetEventById")(event_id=10**6)),
+            (stub.GetTagById, requestType("GetTagById")(id=10**6)),
+            (
+                stub.JoinEvent,
+                requestType("JoinEvent")(
+                    user_id=joined.user_id, event_id=joined.event_id
+                ),
+            ),
+        )
+        statuses = []
+        for method, request in calls:
+            with pytest.raises(grpc.RpcError) as error:
+                method(request, timeout=10)
+            statuses.append((error.value.code(), error.value.details()))
+        return statuses
+
+
+def test_server_modes_return_the_same_errors(database):
+    with initEngine().connect() as connection:
+        joined = connection.execute(
+            UserEvent.__table__.select().order_by(UserEvent.id).limit(1)
+        ).first()
+
+    results = {
+        "thread": threadedStatuses(joined),
+        "aio": asyncio.run(aioStatuses(joined)),
+    }
+
+    assert results["thread"] == [
+        (grpc.StatusCode.NOT_FOUND, "Event not found."),
+        (grpc.StatusCode.NOT_FOUND, "Tag not found"),
+        (grpc.StatusCode.ALREADY_EXISTS, "User already send request to this event."),
+    ]
+    assert results["aio"] == results["thread"]